@@ -0,0 +1,293 @@
+"""
+Benchmarks for the data extraction and plotting functions behind the UI.
+
+Each benchmark is run on synthetic models across a grid of sizes, varying one
+dimension at a time from a base case, and measures wall time and peak memory
+allocated through Python (via tracemalloc). Results can be compared against,
+and saved as, baselines. Run `python benchmarks/run.py --help` for options.
+
+"""
+
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import click
+
+from calligraph import core, geo, plot, synthetic
+
+HERE = Path(__file__).parent
+MODELS_DIR = HERE / ".models"
+BASELINES = HERE / "baselines.json"
+
+BASE_SIZE = dict(nodes=10, techs=10, carriers=1, links=9, timesteps=720)
+
+# Each dimension is scaled independently from BASE_SIZE
+SIZE_GRID = {
+    "nodes": [40, 160],
+    "techs": [40, 160],
+    "carriers": [4],
+    "links": [60, 240],
+    "timesteps": [4380, 8760],
+}
+
+
+def get_cases(quick=False):
+    cases = {"base": BASE_SIZE}
+    if quick:
+        return cases
+    for dim, values in SIZE_GRID.items():
+        for value in values:
+            cases[f"{dim}={value}"] = {**BASE_SIZE, dim: value}
+    return cases
+
+
+def get_model_path(size):
+    # Models are generated once per size and kept for later runs
+    name = "_".join(f"{k}{v}" for k, v in size.items()) + ".nc"
+    path = MODELS_DIR / name
+    if not path.exists():
+        MODELS_DIR.mkdir(exist_ok=True)
+        synthetic.generate_model(path.with_suffix(".tmp"), **size)
+        path.with_suffix(".tmp").rename(path)
+    return path
+
+
+def all_selectors(model_container):
+    coords = model_container.combined_data.coords
+    return {
+        coord: coords[coord].to_index().to_list()
+        for coord in ["carriers", "nodes", "techs", "costs"]
+        if coord in coords
+    }
+
+
+# Each benchmark maps to a setup function, which is not timed and returns the
+# function to time. The setup always loads a fresh ModelContainer so that
+# timings include building any derived data on first use.
+
+
+def bench_load(path):
+    return lambda: core.ModelContainer(path)
+
+
+def bench_get_df_static(path):
+    model_container = core.ModelContainer(path)
+    selectors = all_selectors(model_container)
+    return lambda: core.get_df_static(model_container, "flow_cap", selectors)
+
+
+def bench_get_df_timeseries(path):
+    model_container = core.ModelContainer(path)
+    selectors = all_selectors(model_container)
+    return lambda: core.get_df_timeseries(
+        model_container, "flow_out", selectors, resample="1D", sum_by="nodes"
+    )
+
+
+def bench_fig_object_timeseries_duration(path):
+    model_container = core.ModelContainer(path)
+    data = core.get_df_timeseries(
+        model_container, "flow_out", all_selectors(model_container), sum_by="nodes"
+    )
+    return lambda: plot.fig_object_timeseries_duration(
+        model_container, "flow_out", data
+    )
+
+
+def bench_get_geo_data(path):
+    model_container = core.ModelContainer(path)
+    selectors = all_selectors(model_container)
+    techs = [
+        tech
+        for tech, base_tech in model_container.base_tech.items()
+        if base_tech != "transmission"
+    ]
+    return lambda: geo.get_geo_data(
+        model_container, techs, "flow_cap", selectors, "nodes", geo.get_nodes_geo
+    )
+
+
+def bench_get_line_xs_ys(path):
+    model_container = core.ModelContainer(path)
+    return lambda: geo.get_line_xs_ys(model_container, as_mercator=True)
+
+
+BENCHMARKS = {
+    "load": bench_load,
+    "get_df_static": bench_get_df_static,
+    "get_df_timeseries": bench_get_df_timeseries,
+    "fig_object_timeseries_duration": bench_fig_object_timeseries_duration,
+    "get_geo_data": bench_get_geo_data,
+    "get_line_xs_ys": bench_get_line_xs_ys,
+}
+
+
+def measure(setup, path, repeat):
+    times = []
+    for _ in range(repeat):
+        func = setup(path)
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    # Memory is measured in a separate run as tracemalloc slows down execution
+    func = setup(path)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return dict(
+        time_median=statistics.median(times), time_min=min(times), peak_mib=peak / 2**20
+    )
+
+
+# Differences below these are not reported as regressions, however large
+# relative to the baseline, as they are within measurement noise
+MIN_TIME_DIFFERENCE = 0.005
+MIN_MEMORY_DIFFERENCE_MIB = 1
+
+
+def compare(results, baselines, time_tolerance, memory_tolerance):
+    regressions = []
+    for case, benchmarks in results.items():
+        for name, result in benchmarks.items():
+            baseline = baselines.get(case, {}).get(name)
+            if baseline is None:
+                continue
+            time_ratio = result["time_median"] / baseline["time_median"]
+            memory_ratio = result["peak_mib"] / max(baseline["peak_mib"], 1e-9)
+            result["time_ratio"] = time_ratio
+            result["memory_ratio"] = memory_ratio
+            slower = (
+                time_ratio > 1 + time_tolerance
+                and result["time_median"] - baseline["time_median"]
+                > MIN_TIME_DIFFERENCE
+            )
+            larger = (
+                memory_ratio > 1 + memory_tolerance
+                and result["peak_mib"] - baseline["peak_mib"]
+                > MIN_MEMORY_DIFFERENCE_MIB
+            )
+            if slower or larger:
+                regressions.append((case, name, time_ratio, memory_ratio))
+    return regressions
+
+
+@click.command()
+@click.option(
+    "--benchmark",
+    "-b",
+    "benchmarks",
+    multiple=True,
+    type=click.Choice(list(BENCHMARKS)),
+    help="Benchmark to run; can be given several times. Defaults to all.",
+)
+@click.option(
+    "--case",
+    "-c",
+    "cases",
+    multiple=True,
+    help="Size case to run, e.g. `base` or `nodes=40`; can be given several times.",
+)
+@click.option("--quick", is_flag=True, help="Only run the base case.")
+@click.option("--repeat", "-r", default=5, help="Timed runs per benchmark.")
+@click.option(
+    "--baselines",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=BASELINES,
+    help="Baselines file to compare against or save to.",
+)
+@click.option(
+    "--save-baseline", is_flag=True, help="Save the results to the baselines file."
+)
+@click.option(
+    "--time-tolerance",
+    default=0.25,
+    help="Relative slowdown over the baseline reported as a regression.",
+)
+@click.option(
+    "--memory-tolerance",
+    default=0.1,
+    help="Relative increase in peak memory over the baseline reported as a regression.",
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Write the results as JSON to this file.",
+)
+def main(
+    benchmarks,
+    cases,
+    quick,
+    repeat,
+    baselines,
+    save_baseline,
+    time_tolerance,
+    memory_tolerance,
+    output,
+):
+    all_cases = get_cases(quick=quick)
+    if cases:
+        unknown = set(cases) - set(get_cases())
+        if unknown:
+            raise click.BadParameter(
+                f"unknown cases {sorted(unknown)}, choose from {list(get_cases())}"
+            )
+        all_cases = {k: v for k, v in get_cases().items() if k in cases}
+    benchmarks = benchmarks or list(BENCHMARKS)
+
+    results = {}
+    for case, size in all_cases.items():
+        path = get_model_path(size)
+        results[case] = {}
+        for name in benchmarks:
+            result = measure(BENCHMARKS[name], path, repeat)
+            results[case][name] = result
+            click.echo(
+                f"{case:<16} {name:<32} {result['time_median'] * 1000:10.1f} ms "
+                f"{result['peak_mib']:10.1f} MiB"
+            )
+
+    stored = json.loads(baselines.read_text()) if baselines.exists() else {}
+    regressions = compare(
+        results, stored.get("results", {}), time_tolerance, memory_tolerance
+    )
+    for case, name, time_ratio, memory_ratio in regressions:
+        click.echo(
+            f"REGRESSION {case} {name}: time x{time_ratio:.2f}, "
+            f"peak memory x{memory_ratio:.2f}",
+            err=True,
+        )
+
+    if output:
+        output.write_text(json.dumps(results, indent=2))
+
+    if save_baseline:
+        # Merge so that partial runs only replace the results they measured
+        for case, benchmarks_ in results.items():
+            for name, result in benchmarks_.items():
+                stored.setdefault("results", {}).setdefault(case, {})[name] = {
+                    k: result[k] for k in ["time_median", "time_min", "peak_mib"]
+                }
+        stored["machine"] = dict(
+            python=sys.version.split()[0],
+            platform=platform.platform(),
+            processor=platform.processor(),
+        )
+        baselines.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n")
+        click.echo(f"Saved baselines to {baselines}")
+    elif regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,29 @@
 __version__ = "0.1.1.dev7"
 
-import calligraph.cli
-import calligraph.core
-import calligraph.ui
+import importlib
+
+# Submodules are imported on first access, so that e.g. `calligraph.core` can
+# be used from scripts and notebooks without importing Panel
+_SUBMODULES = [
+    "cache",
+    "cli",
+    "core",
+    "geo",
+    "loader",
+    "loadtest",
+    "pages",
+    "perf",
+    "plot",
+    "selector",
+    "snapshot",
+    "synthetic",
+    "tiles",
+    "ui",
+    "watch",
+]
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"calligraph.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
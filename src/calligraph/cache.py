@@ -0,0 +1,214 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+
+
+def default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "calligraph" / "results"
+
+
+class ResultCache:
+    """
+    On-disk cache of computed data frames, shared by all processes using the
+    same directory and kept across restarts.
+
+    Entries are keyed by the content hash of the model file and a normalised
+    query, and stored as uncompressed NumPy `.npz` archives with one array per
+    column, so that they are loaded without unpickling. Entries are written
+    to a temporary file and moved into place, so that concurrent readers
+    never see partial entries. When the cache exceeds `max_bytes`, the least
+    recently used entries are deleted down to `EVICT_TO` of `max_bytes`;
+    reading an entry marks it as used by updating its modification time. The
+    size of the cache is only listed when first writing and when evicting, and
+    otherwise kept up to date with the entries written by this instance.
+
+    Args:
+        directory (str | Path, optional): Cache directory. Defaults to
+            `calligraph/results` in the user's cache directory.
+        max_bytes (int): Size above which entries are evicted.
+
+    """
+
+    SUFFIX = ".npz"
+    EVICT_TO = 0.9
+
+    def __init__(self, directory: str | Path | None = None, max_bytes: int = 2**30):
+        self.directory = Path(directory) if directory else default_cache_dir()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._file_hashes = {}
+        self._size = None
+
+    def file_hash(self, path: str | Path) -> str:
+        """
+        Returns the SHA-256 of the content of the file at `path`.
+
+        Hashes are remembered, in memory and in the cache directory, by path,
+        size and modification time, so that a file is only read once.
+
+        """
+        stat = os.stat(path)
+        identity = f"{Path(path).resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+        if identity not in self._file_hashes:
+            memo = self.directory / "hashes" / _digest(identity)
+            try:
+                file_hash = memo.read_text()
+            except FileNotFoundError:
+                file_hash = _file_digest(path)
+                memo.parent.mkdir(exist_ok=True)
+                _write_atomic(memo, lambda f: f.write(file_hash.encode()))
+            self._file_hashes[identity] = file_hash
+        return self._file_hashes[identity]
+
+    def key(self, source: str | list, name: str, query: dict) -> str:
+        """
+        Returns the key of the result of computation `name` with arguments
+        `query` on data identified by `source`, e.g. a file hash.
+
+        """
+        return _digest(json.dumps([source, name, query], sort_keys=True))
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / (key + self.SUFFIX)
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                df = _from_arrays(npz)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            LOGGER.warning(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+        return df
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        arrays = _to_arrays(df)
+        if arrays is None:
+            return
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        _write_atomic(path, lambda f: np.savez(f, **arrays))
+        if self._size is None:
+            self._size = int(self.entries().bytes.sum())
+        else:
+            self._size += path.stat().st_size
+        # Evicting in batches saves listing the cache on every write
+        if self._size > self.max_bytes:
+            self.evict(int(self.max_bytes * self.EVICT_TO))
+
+    def entries(self) -> pd.DataFrame:
+        """
+        Returns the path, size and last use of every entry, least recently
+        used first.
+
+        """
+        rows = []
+        for path in self.directory.glob("*/*" + self.SUFFIX):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # Evicted by another process
+                continue
+            rows.append((path, stat.st_size, stat.st_mtime))
+        df = pd.DataFrame(rows, columns=["path", "bytes", "last_used"])
+        df["last_used"] = pd.to_datetime(df["last_used"], unit="s")
+        return df.sort_values("last_used", ignore_index=True)
+
+    def evict(self, max_bytes: int | None = None) -> int:
+        """
+        Deletes the least recently used entries until the cache is no larger
+        than `max_bytes` (by default, `self.max_bytes`). Returns the number of
+        entries deleted.
+
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        excess = entries.bytes.sum() - max_bytes
+        deleted = 0
+        for path, nbytes in zip(entries.path, entries.bytes):
+            if excess <= 0:
+                break
+            path.unlink(missing_ok=True)
+            excess -= nbytes
+            deleted += 1
+        self._size = int(excess + max_bytes)
+        return deleted
+
+    def clear(self) -> int:
+        return self.evict(max_bytes=0)
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _write_atomic(path: Path, write) -> None:
+    # Writes to a temporary file first, which is then moved into place
+    with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False) as f:
+        write(f)
+    os.replace(f.name, path)
+
+
+def _file_digest(path: str | Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(2**20):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _to_arrays(df: pd.DataFrame) -> dict | None:
+    # One array per column, with columns stored by position as their names
+    # need not be valid identifiers. Categorical columns are stored as their
+    # codes and categories
+    if not all(isinstance(i, str) for i in df.columns):
+        return None
+    arrays = {"columns": np.array([str(i) for i in df.columns])}
+    for i, col in enumerate(df.columns):
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories = _string_array(values.cat.categories.to_numpy())
+            if categories is None:
+                return None
+            arrays[f"c{i}_categories"] = categories
+            values = values.cat.codes
+        values = _string_array(values.to_numpy())
+        if values is None:
+            return None
+        arrays[f"c{i}"] = values
+    return arrays
+
+
+def _string_array(values: np.ndarray) -> np.ndarray | None:
+    # Only string objects are stored, as fixed-width unicode arrays
+    if values.dtype != object:
+        return values
+    if not all(isinstance(v, str) for v in values):
+        return None
+    return values.astype(str)
+
+
+def _from_arrays(npz) -> pd.DataFrame:
+    columns = npz["columns"]
+    data = {}
+    for i, col in enumerate(columns):
+        values = npz[f"c{i}"]
+        if f"c{i}_categories" in npz:
+            categories = npz[f"c{i}_categories"].astype(object)
+            values = pd.Categorical.from_codes(values, categories)
+        elif values.dtype.kind == "U":
+            values = values.astype(object)
+        data[str(col)] = values
+    return pd.DataFrame(data, columns=[str(i) for i in columns])
@@ -1,10 +1,64 @@
+import json
+import logging
+import tempfile
+from pathlib import Path
+
 import click
 import panel as pn
+import xyzservices.providers
 
 import calligraph
+import calligraph.cache
+import calligraph.core
+import calligraph.loadtest
+import calligraph.perf
+import calligraph.snapshot
+import calligraph.synthetic
+import calligraph.tiles
+import calligraph.ui
+import calligraph.watch
+
+
+def _parse_size(ctx, param, value):
+    # Parses sizes such as "512M" or "4G" into bytes
+    if value is None:
+        return None
+    units = {"K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+    value = value.strip().upper().removesuffix("B")
+    try:
+        if value and value[-1] in units:
+            return int(float(value[:-1]) * units[value[-1]])
+        return int(value)
+    except ValueError:
+        raise click.BadParameter("must be a size such as 512M or 4G")
+
+
+class DefaultCommandGroup(click.Group):
+    """
+    Group that runs the `serve` command when the first argument is not
+    a command, so that `calligraph model.nc` keeps working.
+
+    """
+
+    default_command = "serve"
 
+    def parse_args(self, ctx, args):
+        if args and args[0] not in [*self.commands, "--help", "--version"]:
+            args = [self.default_command, *args]
+        return super().parse_args(ctx, args)
 
-@click.command()
+
+@click.group(cls=DefaultCommandGroup)
+@click.version_option()
+def calligraph_cli():
+    """
+    Interactive visualisation of Calliope models. Run `calligraph PATH` to open
+    the Calliope NetCDF model file given by PATH.
+
+    """
+
+
+@calligraph_cli.command()
 @click.argument("path", type=click.Path(exists=True))
 @click.option(
     "--port",
@@ -18,16 +72,399 @@ import calligraph
     help="Run in development mode. Currently this enables autoreload on code change.",
     is_flag=True,
 )
-@click.version_option()
-def calligraph_cli(path, no_browser, port, development):
+@click.option(
+    "--profile",
+    help=(
+        "Record timings of data extraction and plotting, log them and show them on "
+        "a Performance page. Can also be enabled by setting the "
+        f"{calligraph.perf.ENV_VAR} environment variable."
+    ),
+    is_flag=True,
+)
+@click.option(
+    "--memory-limit",
+    help=(
+        "Memory that loaded variables and derived data may take up, e.g. 4G. When "
+        "exceeded, the least recently used variables are unloaded and reloaded "
+        "from file when needed again."
+    ),
+    callback=_parse_size,
+)
+@click.option(
+    "--compact",
+    help=(
+        "Use categorical rather than string columns for labels such as nodes and "
+        "techs in extracted data, which takes up less memory for large models."
+    ),
+    is_flag=True,
+)
+@click.option(
+    "--float32",
+    help="Extract values as single rather than double precision floats.",
+    is_flag=True,
+)
+@click.option(
+    "--workers",
+    help=(
+        "Number of threads across which large sums, resampling and duration "
+        "sorting are split."
+    ),
+    default=1,
+    show_default=True,
+)
+@click.option(
+    "--representative-days",
+    help=(
+        "For models solved with time clustering, show timeseries over the "
+        "representative days rather than over the full timeline reconstructed "
+        "from them."
+    ),
+    is_flag=True,
+)
+@click.option(
+    "--watch",
+    help=(
+        "Watch PATH for changes, e.g. when the model is re-solved, reloading "
+        "changed variables and refreshing open sessions."
+    ),
+    is_flag=True,
+)
+@click.option(
+    "--watch-interval",
+    help="Seconds between checks of PATH for changes with --watch.",
+    default=2.0,
+    show_default=True,
+)
+@click.option(
+    "--result-cache",
+    help=(
+        "Keep computed data on disk, so that it is reused across sessions, restarts "
+        "and concurrently running servers of the same model file."
+    ),
+    is_flag=True,
+)
+@click.option(
+    "--result-cache-dir",
+    help="Directory for --result-cache. Defaults to calligraph/results in the user cache directory.",
+    type=click.Path(file_okay=False),
+)
+@click.option(
+    "--result-cache-size",
+    help="Size of --result-cache above which the least recently used data is deleted, e.g. 4G.",
+    default="1G",
+    show_default=True,
+    callback=_parse_size,
+)
+@click.option(
+    "--tile-cache",
+    help=(
+        "Serve map tiles from the calligraph server, caching them in this "
+        "directory, instead of loading them from the tile provider in the browser."
+    ),
+    type=click.Path(file_okay=False),
+)
+@click.option(
+    "--tile-archive",
+    help=(
+        "MBTiles file, or directory of tiles laid out as {z}/{x}/{y}.png, to serve "
+        "map tiles from before the cache. Requires --tile-cache."
+    ),
+    type=click.Path(exists=True),
+)
+@click.option(
+    "--tile-provider",
+    help="Upstream map tile provider for --tile-cache, as named by xyzservices.",
+    default=calligraph.tiles.DEFAULT_CACHE_PROVIDER.name,
+    show_default=True,
+)
+@click.option(
+    "--tile-api-key",
+    help=(
+        "API key for --tile-provider, for providers that require one. Can also be "
+        "set with the CALLIGRAPH_TILE_API_KEY environment variable."
+    ),
+    envvar="CALLIGRAPH_TILE_API_KEY",
+)
+@click.option(
+    "--offline-tiles",
+    help="Never fetch map tiles from the provider. Requires --tile-cache.",
+    is_flag=True,
+)
+def serve(
+    path,
+    no_browser,
+    port,
+    development,
+    profile,
+    memory_limit,
+    compact,
+    float32,
+    workers,
+    representative_days,
+    watch,
+    watch_interval,
+    result_cache,
+    result_cache_dir,
+    result_cache_size,
+    tile_cache,
+    tile_archive,
+    tile_provider,
+    tile_api_key,
+    offline_tiles,
+):
     """
     Opens the Calliope NetCDF model file given by PATH in an interactive visualisation
     tool.
 
     """
-    app = calligraph.ui.app(path)
-    devt_kwargs = dict(autoreload=True) if development is True else dict()
-    pn.serve(port=port, panels=app, show=False if no_browser else True, **devt_kwargs)
+    if profile:
+        calligraph.perf.RECORDER.enable()
+    if calligraph.perf.RECORDER.enabled or watch:
+        logging.basicConfig()
+    if calligraph.perf.RECORDER.enabled:
+        logging.getLogger(calligraph.perf.__name__).setLevel(logging.INFO)
+    if watch:
+        logging.getLogger(calligraph.watch.__name__).setLevel(logging.INFO)
+    if tile_cache is not None:
+        try:
+            tile_cache = calligraph.tiles.TileCache(
+                tile_cache,
+                provider=xyzservices.providers.query_name(tile_provider),
+                archive=tile_archive,
+                offline=offline_tiles,
+                api_key=tile_api_key,
+            )
+        except ValueError as e:
+            raise click.UsageError(f"{e}, which --tile-api-key sets")
+        serve_kwargs = dict(extra_patterns=calligraph.tiles.tile_patterns(tile_cache))
+    elif tile_archive is not None or tile_api_key is not None or offline_tiles:
+        raise click.UsageError(
+            "--tile-archive, --tile-api-key and --offline-tiles need --tile-cache"
+        )
+    else:
+        serve_kwargs = dict()
+    if result_cache:
+        result_cache = calligraph.cache.ResultCache(
+            result_cache_dir, max_bytes=result_cache_size
+        )
+    elif result_cache_dir is not None:
+        raise click.UsageError("--result-cache-dir needs --result-cache")
+    else:
+        result_cache = None
+    app = calligraph.ui.app(
+        path,
+        tile_cache=tile_cache,
+        watch=watch_interval if watch else None,
+        memory_limit=memory_limit,
+        result_cache=result_cache,
+        compact=compact,
+        float32=float32,
+        workers=workers,
+        expand_clusters=not representative_days,
+    )
+    if development is True:
+        serve_kwargs["autoreload"] = True
+    pn.serve(port=port, panels=app, show=False if no_browser else True, **serve_kwargs)
+
+
+@calligraph_cli.command()
+@click.argument("path", type=click.Path(exists=True), required=False)
+@click.option("--sessions", "-s", help="Number of concurrent sessions.", default=10)
+@click.option(
+    "--interactions", "-i", help="Number of interactions per session.", default=20
+)
+@click.option(
+    "--think-time",
+    help="Mean pause between the interactions of a session, in seconds.",
+    default=1.0,
+)
+@click.option("--nodes", help="Nodes in the synthetic model.", default=10)
+@click.option("--techs", help="Supply techs in the synthetic model.", default=10)
+@click.option("--carriers", help="Carriers in the synthetic model.", default=1)
+@click.option(
+    "--links",
+    help="Transmission links in the synthetic model. Defaults to one less than nodes.",
+    type=int,
+)
+@click.option(
+    "--timesteps", help="Hourly timesteps in the synthetic model.", default=168
+)
+@click.option(
+    "--seed", help="Seed for the synthetic model and interactions.", default=0
+)
+@click.option(
+    "--memory-limit", help="As for `calligraph serve`, e.g. 4G.", callback=_parse_size
+)
+@click.option("--workers", help="As for `calligraph serve`.", default=1)
+@click.option(
+    "--output", "-o", help="Write the results as JSON to this file.", type=click.Path()
+)
+def loadtest(
+    path,
+    sessions,
+    interactions,
+    think_time,
+    nodes,
+    techs,
+    carriers,
+    links,
+    timesteps,
+    seed,
+    memory_limit,
+    workers,
+    output,
+):
+    """
+    Serves the Calliope NetCDF model file given by PATH locally and simulates
+    concurrent sessions interacting with it, reporting interaction latencies,
+    throughput and server memory use. Without PATH, a synthetic model of the
+    given size is generated and used.
+
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if path is None:
+            click.echo("Generating synthetic model...")
+            path = calligraph.synthetic.generate_model(
+                Path(tmpdir) / "synthetic.nc",
+                nodes=nodes,
+                techs=techs,
+                carriers=carriers,
+                links=links,
+                timesteps=timesteps,
+                seed=seed,
+            )
+        model_container = calligraph.core.ModelContainer(
+            path, memory_limit=memory_limit, workers=workers
+        )
+        test = calligraph.loadtest.LoadTest(
+            model_container,
+            sessions=sessions,
+            interactions=interactions,
+            think_time=think_time,
+            seed=seed,
+        )
+        test.run()
+
+    latencies = test.latency_summary()
+    summary = test.summary()
+    click.echo(latencies.to_string(float_format="{:.3f}".format))
+    click.echo(json.dumps(summary, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(
+                dict(summary=summary, latencies=latencies.to_dict(orient="index")),
+                f,
+                indent=2,
+            )
+
+
+@calligraph_cli.command()
+@click.argument("path", type=click.Path(exists=True))
+@click.argument("output", type=click.Path(dir_okay=False))
+@click.option(
+    "--variable",
+    "-v",
+    "variables",
+    multiple=True,
+    help="Variable to include; can be given several times. Defaults to all results variables.",
+)
+@click.option(
+    "--resolution",
+    "-r",
+    "resolutions",
+    multiple=True,
+    type=click.Choice(calligraph.snapshot.RESOLUTIONS),
+    help=(
+        "Time resolution of timeseries plots to include; can be given several "
+        "times. Defaults to Monthly, Weekly and Daily."
+    ),
+)
+@click.option(
+    "--preset-by",
+    multiple=True,
+    default=["carriers"],
+    show_default=True,
+    help=(
+        "Dimension to add one filter preset per member of, next to no filter; "
+        "can be given several times."
+    ),
+)
+def snapshot(path, output, variables, resolutions, preset_by):
+    """
+    Writes a static snapshot of the Calliope NetCDF model file given by PATH to
+    the HTML file OUTPUT, which can be browsed without a server. It contains the
+    plots of every combination of the chosen variables, time resolutions and
+    filter presets.
+
+    """
+    model_container = calligraph.core.ModelContainer(path)
+    unknown = set(preset_by) - set(model_container.combined_data.coords)
+    if unknown:
+        raise click.BadParameter(f"unknown dimensions {sorted(unknown)}")
+    unknown = set(variables) - set(model_container.catalog)
+    if unknown:
+        raise click.BadParameter(f"unknown variables {sorted(unknown)}")
+    snapshot = calligraph.snapshot.build_snapshot(
+        model_container,
+        variables=list(variables) or None,
+        resolutions=list(resolutions) or calligraph.snapshot.DEFAULT_RESOLUTIONS,
+        presets=calligraph.snapshot.filter_presets(model_container, preset_by),
+    )
+    snapshot.write(output, title=model_container.name)
+    click.echo(
+        f"Wrote {len(snapshot.states)} views, with {len(snapshot.pool)} distinct "
+        f"arrays, to {output} ({Path(output).stat().st_size / 2**20:.1f} MiB)"
+    )
+
+
+@calligraph_cli.group()
+def cache():
+    """
+    Inspects and clears the result cache used by `calligraph serve --result-cache`.
+
+    """
+
+
+_cache_dir_option = click.option(
+    "--dir",
+    "directory",
+    help="Cache directory, as given to --result-cache-dir.",
+    type=click.Path(file_okay=False),
+)
+
+
+@cache.command()
+@_cache_dir_option
+def info(directory):
+    """
+    Shows the location, size and number of entries of the result cache.
+
+    """
+    result_cache = calligraph.cache.ResultCache(directory)
+    entries = result_cache.entries()
+    click.echo(f"Directory: {result_cache.directory}")
+    click.echo(f"Entries: {len(entries)}")
+    click.echo(f"Size: {entries.bytes.sum() / 2**20:.1f} MiB")
+    if len(entries):
+        click.echo(f"Least recently used: {entries.last_used.iloc[0]:%Y-%m-%d %H:%M}")
+        click.echo(f"Most recently used: {entries.last_used.iloc[-1]:%Y-%m-%d %H:%M}")
+
+
+@cache.command()
+@_cache_dir_option
+@click.option(
+    "--size",
+    help="Only delete the least recently used entries until the cache is this size, e.g. 512M.",
+    callback=_parse_size,
+)
+def clear(directory, size):
+    """
+    Deletes entries from the result cache.
+
+    """
+    result_cache = calligraph.cache.ResultCache(directory)
+    deleted = result_cache.evict(max_bytes=size or 0)
+    click.echo(f"Deleted {deleted} entries from {result_cache.directory}")
 
 
 if __name__ == "__main__":
@@ -1,11 +1,26 @@
+import hashlib
+import os
 import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List
 
 import calliope
+import numpy as np
 import pandas as pd
 import param
 import xarray as xr
+from pyproj import Transformer
+
+from calligraph.cache import ResultCache
+from calligraph.perf import timed, timer
+
+# Transform from Lat/Lon to Web Mercator
+# `always_xy` ensures that the order of the resulting tuple remains (horizontal axis, vertical axis), irrespective of the CRS.
+LONLAT_TO_MERCATOR = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
 
 
 class ResettableParam(param.Parameterized):
@@ -52,63 +67,215 @@ class ColorPickerParam(ResettableParam):
 
 
 class ModelContainer:
-    def __init__(self, path: str | Path):
+    def __init__(
+        self,
+        path: str | Path,
+        memory_limit: int | None = None,
+        result_cache: ResultCache | None = None,
+        compact: bool = False,
+        float32: bool = False,
+        workers: int = 1,
+        defer_results: bool = False,
+        expand_clusters: bool = True,
+    ):
         """
         Returns a new ModelContainer from the given `path` to a Calliope NetCDF file.
 
         Args:
             path (str | Path)
+            memory_limit (int, optional): Number of bytes that loaded variables and
+                derived data may take up. When exceeded, the least recently used
+                variables are unloaded, to be reloaded from `path` on demand.
+            result_cache (ResultCache, optional): On-disk cache in which computed
+                data frames are kept across sessions, restarts and processes.
+            compact (bool): Return extracted data frames with categorical rather
+                than string label columns (e.g. nodes and techs).
+            float32 (bool): Return the values in extracted data frames as
+                single rather than double precision floats.
+            workers (int): Number of threads across which large reductions (sums,
+                resampling and duration sorting) are split.
+            defer_results (bool): Only load the inputs, which include everything
+                the UI itself depends on, and leave the results unloaded until
+                first use or `load_unloaded`.
+            expand_clusters (bool): For models solved with time clustering, extract
+                timeseries over the full timeline reconstructed from the
+                representative days, rather than over the representative days.
         """
-        self.model = calliope.read_netcdf(path)
+        self.path = Path(path)
+        self.memory_limit = memory_limit
+        self.result_cache = result_cache
+        self.compact = compact
+        self.float32 = float32
+        self.workers = workers
+        self.expand_clusters = expand_clusters
+        self.revision = 0
+        self.structure_revision = 0
+        self._checksums = None
+        self._load_lock = threading.RLock()
+        self._load(defer_results=defer_results)
+
+    def _load(self, defer_results=False):
+        self.loaded_file_identity = self.file_identity()
+        if defer_results:
+            self.model, deferred = self._read_without_results()
+        else:
+            self.model, deferred = calliope.read_netcdf(self.path), {}
         self.combined_data = xr.merge(
             [self.model.results, self.model.inputs], compat="override"
-        )
+        ).drop_vars(list(deferred), errors="ignore")
+        self.catalog = {
+            **{
+                var: dict(dims=dims, group="results")
+                for var, (dims, _, _) in deferred.items()
+            },
+            **self._init_catalog(),
+        }
+        self._last_used = OrderedDict((var, 0.0) for var in self.catalog)
+        self._unloaded = {
+            var: (dtype, attrs) for var, (_, dtype, attrs) in deferred.items()
+        }
         self.colors_techs = self._init_tech_colors()
+        self.coord_indexes = {
+            coord: self.combined_data.indexes[coord]
+            for coord in self.combined_data.indexes
+        }
+        self._init_tech_tables()
+        self.tech_groupings = {"base_tech": self.base_tech_members}
+        self._cubes = {}
+        self._selections = OrderedDict()
+        self._network = None
+        self.timeline = (
+            ClusteredTimeline.from_inputs(self.model.inputs)
+            if self.expand_clusters
+            else None
+        )
         self.update_variables()
 
+    MAX_CACHED_SELECTIONS = 32
+
+    # Variables needed by the UI itself, which are never unloaded
+    PINNED_VARIABLES = [
+        "base_tech",
+        "carrier_in",
+        "carrier_out",
+        "color",
+        "definition_matrix",
+        "latitude",
+        "longitude",
+        "lookup_datestep_cluster",
+        "name",
+        "timestep_cluster",
+    ]
+
+    def _read_without_results(self):
+        # As `calliope.read_netcdf`, but only reads the dimensions, data type and
+        # attributes of the results, which are returned by variable
+        datasets, deferred = {}, {}
+        for group in ["inputs", "results", "attrs"]:
+            try:
+                with xr.open_dataset(self.path, group=group) as ds:
+                    if group == "results":
+                        deferred = {
+                            var: (da.dims, da.dtype, dict(da.attrs))
+                            for var, da in ds.data_vars.items()
+                        }
+                        ds = ds.drop_vars(list(ds.data_vars))
+                    ds.load()
+            except OSError:
+                ds = xr.Dataset()
+            calliope.io._deserialise(ds.attrs)
+            for da in ds.data_vars.values():
+                calliope.io._deserialise(da.attrs)
+            datasets[group] = ds
+        for _, _, attrs in deferred.values():
+            calliope.io._deserialise(attrs)
+        model = calliope.Model(
+            datasets["inputs"],
+            calliope.model.CalliopeAttrs(**datasets["attrs"].attrs),
+            datasets["results"],
+        )
+        return model, deferred
+
+    def _init_catalog(self):
+        # Dimensions and NetCDF group of every variable, kept so that variables
+        # can be listed and reloaded while they are not loaded
+        return {
+            var: dict(
+                dims=self.combined_data[var].dims,
+                group="results" if var in self.model.results else "inputs",
+            )
+            for var in self.combined_data.data_vars
+        }
+
     def update_variables(self, include_inputs=True) -> None:
         """
         Updates `self.variables` with a dictionary with variable kind as keys,
         lists of variables as values.
 
         """
-        if include_inputs:
-            dataset = self.combined_data
-        else:
-            dataset = self.model.results
+        catalog = {
+            k: v["dims"]
+            for k, v in self.catalog.items()
+            if include_inputs or v["group"] == "results"
+        }
 
         variables = dict(
-            variables=sorted(list(dataset.data_vars)),
+            variables=sorted(list(catalog)),
             variables_timesteps=sorted(
-                [var for var in dataset.data_vars if "timesteps" in dataset[var].dims]
+                [var for var, dims in catalog.items() if "timesteps" in dims]
                 + ["flow*"]
             ),
-            variables_notimesteps=sorted(
+            variables_timesteps_nodes=sorted(
+                [
+                    var
+                    for var, dims in catalog.items()
+                    if "timesteps" in dims and "nodes" in dims
+                ]
+            ),
+            variables_timesteps_links=sorted(
                 [
                     var
-                    for var in dataset.data_vars
-                    if "timesteps" not in dataset[var].dims
+                    for var, dims in catalog.items()
+                    if {"timesteps", "nodes", "techs"}.issubset(dims)
+                    and self._has_transmission_values(var)
                 ]
             ),
+            variables_notimesteps=sorted(
+                [var for var, dims in catalog.items() if "timesteps" not in dims]
+            ),
             variables_notimesteps_nodes=sorted(
                 [
                     var
-                    for var in dataset.data_vars
-                    if "timesteps" not in dataset[var].dims
-                    and "nodes" in dataset[var].dims
+                    for var, dims in catalog.items()
+                    if "timesteps" not in dims and "nodes" in dims
                 ]
             ),
             variables_notimesteps_links=sorted(
                 [
                     var
-                    for var in dataset.data_vars
-                    if "timesteps" not in dataset[var].dims
-                    and "nodes" in dataset[var].dims  # FIXME
+                    for var, dims in catalog.items()
+                    if "timesteps" not in dims and "nodes" in dims  # FIXME
                 ]
             ),
         )
         self.variables = variables
 
+    def _has_transmission_values(self, variable: str) -> bool:
+        # Only looks at the first timestep, which is read from the model file
+        # if the variable is not loaded, so as not to load every variable
+        transmission = self.base_tech_members.get("transmission", [])
+
+        def check(da):
+            techs = da.indexes["techs"].intersection(transmission)
+            return bool(
+                len(techs) and da.isel(timesteps=0).sel(techs=techs).notnull().any()
+            )
+
+        if variable in self.combined_data.data_vars:
+            return check(self.combined_data[variable])
+        with xr.open_dataset(self.path, group=self.catalog[variable]["group"]) as ds:
+            return check(ds[variable])
+
     def _init_tech_colors(self):
         techs = self.model.results.techs.to_index().to_list()
         colors = self.model.inputs.color.to_series().to_dict()
@@ -120,14 +287,446 @@ class ModelContainer:
             colors_techs.add_color_parameter(k, v)
         return colors_techs
 
+    def _init_tech_tables(self):
+        # Lookup tables for tech metadata, so that per-tech lookups in the
+        # UI do not need to go through xarray
+        base_tech = self.model.inputs.base_tech.to_series().dropna()
+        self.base_tech = base_tech.to_dict()
+        self.base_tech_members = {
+            k: sorted(v) for k, v in base_tech.groupby(base_tech).groups.items()
+        }
+
     def get_base_tech_members(self, base_tech):
+        base_techs = [base_tech] if isinstance(base_tech, str) else base_tech
         return sorted(
-            self.model.inputs.base_tech.where(
-                self.model.inputs.base_tech.isin(base_tech), drop=True
+            i for bt in base_techs for i in self.base_tech_members.get(bt, [])
+        )
+
+    def get_selection(self, selectors: Dict[str, List[str]]) -> "Selection":
+        """
+        Returns the `Selection` for the given label-based `selectors`.
+
+        Selections are cached, so that all panes bound to the same sidebar state
+        share a single resolved selection.
+
+        """
+        key = tuple(
+            sorted((k, tuple(v)) for k, v in selectors.items() if v is not None)
+        )
+        if key in self._selections:
+            self._selections.move_to_end(key)
+        else:
+            self._selections[key] = Selection(self.coord_indexes, selectors)
+            if len(self._selections) > self.MAX_CACHED_SELECTIONS:
+                self._selections.popitem(last=False)
+        return self._selections[key]
+
+    def add_tech_grouping(self, name: str, groups: Dict[str, List[str]]) -> None:
+        """
+        Registers an additional grouping of techs (e.g. transmission groups) for
+        which partial sums are precomputed by the aggregate cubes.
+
+        """
+        self.tech_groupings[name] = groups
+
+    def get_dataarray(self, variable: str) -> xr.DataArray:
+        """
+        Returns `variable`, reloading it from file if it has been unloaded.
+
+        """
+        if variable == "flow*":
+            return self.get_dataarray("flow_out").fillna(0) - self.get_dataarray(
+                "flow_in"
+            ).fillna(0)
+
+        self._touch(variable)
+        if variable in self._unloaded:
+            with self._load_lock:
+                # Another thread may have loaded it in the meantime
+                if variable in self._unloaded:
+                    self._load_variable(variable)
+                    self.enforce_memory_limit(keep=[variable])
+        return self.combined_data[variable]
+
+    def load_unloaded(self, progress=None) -> List[str]:
+        """
+        Loads all unloaded variables ahead of their use, e.g. the results of a
+        model container created with `defer_results`, as long as they fit
+        within `self.memory_limit`. Returns the variables loaded.
+
+        Args:
+            progress (callable, optional): Called with the variable, its number
+                and the number of variables before each variable is loaded.
+
+        """
+        variables = list(self._unloaded)
+        loaded = []
+        for i, var in enumerate(variables):
+            if progress is not None:
+                progress(var, i, len(variables))
+            with self._load_lock:
+                if var not in self._unloaded:
+                    continue
+                dtype = self._unloaded[var][0]
+                nbytes = np.dtype(dtype).itemsize * np.prod(
+                    [len(self.coord_indexes[dim]) for dim in self.catalog[var]["dims"]]
+                )
+                if (
+                    self.memory_limit is not None
+                    and self.memory_usage().bytes.sum() + nbytes > self.memory_limit
+                ):
+                    continue
+                self._load_variable(var)
+            loaded.append(var)
+        return loaded
+
+    QUERY_FORMATS = ["xarray", "numpy", "pandas", "arrow"]
+
+    def query(
+        self,
+        variables: str | List[str],
+        selectors: Dict[str, List[str]] | None = None,
+        time_subset: tuple | None = None,
+        format: str = "xarray",
+    ) -> xr.Dataset | dict:
+        """
+        Returns `variables` for a single selection, which is resolved once for
+        all of them. Meant for use from scripts and notebooks: unlike the
+        `get_df_*` functions, which prepare data for plotting, results keep the
+        dimensions of the model and are neither filtered nor renamed.
+
+        Args:
+            variables (str | list): Names of variables, which may include "flow*".
+            selectors (dict, optional): Mapping of dimension name to a list of
+                selected labels. Dimensions not given are fully selected.
+            time_subset (tuple, optional): First and last timestep to return.
+            format (str): Format of the result:
+
+                * "xarray": an `xr.Dataset` of all variables.
+                * "numpy": a dict of arrays, one per variable and coordinate, each
+                  variable with the axes of its dimensions in the dataset.
+                * "pandas": a dict mapping every tuple of dimensions to a data
+                  frame indexed by them, with a column per variable that has
+                  these dimensions.
+                * "arrow": as "pandas", with `pyarrow.Table` values (which
+                  requires pyarrow to be installed).
+
+        """
+        if isinstance(variables, str):
+            variables = [variables]
+        if format not in self.QUERY_FORMATS:
+            raise ValueError(f"format must be one of {self.QUERY_FORMATS}")
+        if format == "arrow":
+            try:
+                import pyarrow
+            except ImportError:
+                raise ImportError('format="arrow" requires pyarrow to be installed')
+
+        selection = self.get_selection(selectors or {})
+        with timer("query", variables=len(variables), format=format):
+            ds = selection.isel(
+                xr.Dataset({var: self.get_dataarray(var) for var in variables})
+            )
+            if time_subset and "timesteps" in ds.dims:
+                ds = ds.sel(timesteps=slice(*time_subset))
+            if format == "xarray":
+                return ds
+            if format == "numpy":
+                return {name: da.values for name, da in ds.variables.items()}
+
+            # Variables with the same dimensions share a single index
+            groups = {}
+            for var in variables:
+                groups.setdefault(ds[var].dims, []).append(var)
+            frames = {
+                dims: ds[group].to_dataframe(dim_order=list(dims))[group]
+                for dims, group in groups.items()
+            }
+            if format == "pandas":
+                return frames
+            return {dims: pyarrow.Table.from_pandas(df) for dims, df in frames.items()}
+
+    def _touch(self, variable: str) -> None:
+        for var in ["flow_out", "flow_in"] if variable == "flow*" else [variable]:
+            self._last_used[var] = time.monotonic()
+            self._last_used.move_to_end(var)
+
+    def _load_variable(self, variable: str) -> None:
+        dtype, attrs = self._unloaded[variable]
+        with timer("load_variable", variable=variable):
+            group = self.catalog[variable]["group"]
+            with xr.open_dataset(self.path, group=group) as ds:
+                da = ds[variable].load()
+            indexes = {
+                dim: self.coord_indexes[dim]
+                for dim in da.dims
+                if dim in self.coord_indexes
+            }
+            da = da.reindex(indexes).astype(dtype)
+            da.attrs = attrs
+        # Sessions read the datasets while variables load in the background, so
+        # they are swapped for new ones with the variable rather than modified,
+        # and the variable only counts as loaded once it is in them
+        self.combined_data = self.combined_data.assign({variable: da})
+        setattr(self.model, group, getattr(self.model, group).assign({variable: da}))
+        del self._unloaded[variable]
+
+    def unload(self, variable: str) -> None:
+        """
+        Drops `variable` and any data derived from it from memory. It is
+        reloaded from the model file the next time it is needed.
+
+        """
+        if variable in self.PINNED_VARIABLES:
+            raise ValueError(f"Cannot unload {variable}, which the UI depends on")
+        with self._load_lock:
+            if variable not in self.combined_data.data_vars:
+                return
+
+            # Marked as unloaded first, so that readers wait for the lock and
+            # load it again rather than finding it missing
+            da = self.combined_data[variable]
+            self._unloaded[variable] = (da.dtype, dict(da.attrs))
+            self.combined_data = self.combined_data.drop_vars(variable)
+            group = self.catalog[variable]["group"]
+            setattr(self.model, group, getattr(self.model, group).drop_vars(variable))
+
+            self._cubes.pop(variable, None)
+            if variable in ["flow_out", "flow_in"]:
+                self._cubes.pop("flow*", None)
+
+    def unload_idle(self, idle_seconds: float = 0) -> List[str]:
+        """
+        Unloads all variables that have not been used in the last
+        `idle_seconds` and returns their names.
+
+        """
+        now = time.monotonic()
+        idle = [
+            var
+            for var, last_used in self._last_used.items()
+            if now - last_used >= idle_seconds
+            and var not in self.PINNED_VARIABLES
+            and var not in self._unloaded
+        ]
+        for var in idle:
+            self.unload(var)
+        return idle
+
+    def enforce_memory_limit(self, keep: List[str] = []) -> None:
+        """
+        Unloads least recently used variables until the memory taken up by
+        variables and derived data is below `self.memory_limit`.
+
+        """
+        if self.memory_limit is None:
+            return
+        total = self.memory_usage().bytes.sum()
+        for var in list(self._last_used):
+            if total <= self.memory_limit:
+                break
+            if var in keep or var in self.PINNED_VARIABLES or var in self._unloaded:
+                continue
+            before = self.memory_usage().bytes.sum()
+            self.unload(var)
+            total -= before - self.memory_usage().bytes.sum()
+
+    def memory_usage(self) -> pd.DataFrame:
+        """
+        Returns the resident bytes of every loaded variable and of the data
+        derived from them (aggregate cubes, cached selections).
+
+        """
+        # Takes copies, as other threads may be loading or unloading variables
+        data = self.combined_data
+        rows = [("variable", var, data[var].nbytes) for var in data.data_vars]
+        rows += [
+            ("cube", var, cube.nbytes(include_data=var not in data))
+            for var, cube in list(self._cubes.items())
+        ]
+        rows.append(
+            (
+                "selections",
+                "",
+                sum(
+                    positions.nbytes
+                    for selection in list(self._selections.values())
+                    for positions in selection.positions.values()
+                ),
             )
-            .techs.to_index()
-            .to_list()
         )
+        return pd.DataFrame(rows, columns=["kind", "name", "bytes"])
+
+    def get_cube(self, variable: str) -> "AggregateCube":
+        """
+        Returns the (lazily built) `AggregateCube` for `variable`.
+
+        """
+        if variable in self._cubes:
+            self._touch(variable)
+        else:
+            with timer("get_cube.build", variable=variable):
+                self._cubes[variable] = AggregateCube(
+                    self.get_dataarray(variable),
+                    groupings={"techs": self.tech_groupings},
+                    workers=self.workers,
+                )
+            self.enforce_memory_limit(
+                keep=["flow_out", "flow_in"] if variable == "flow*" else [variable]
+            )
+        return self._cubes[variable]
+
+    def file_identity(self) -> tuple:
+        """
+        Returns the size and modification time of the model file, which change
+        whenever it is written to.
+
+        """
+        stat = os.stat(self.path)
+        return (stat.st_size, stat.st_mtime_ns)
+
+    @property
+    def tracking_changes(self) -> bool:
+        return self._checksums is not None
+
+    def track_changes(self) -> None:
+        """
+        Records a checksum of every variable in the model file, against which
+        `read_changes` detects changed variables.
+
+        """
+        identity = self.loaded_file_identity
+        structure, self._checksums = self._read_checksums()
+        self._structure = structure
+        if self.file_identity() != identity:
+            # The file changed after it was loaded, so that the checksums may
+            # not match the loaded data
+            self._load()
+            self._bump_revision(structure=True)
+
+    def _read_checksums(self):
+        # Reads the variables of the model file one at a time, returning the
+        # variables and coordinates per group, and a checksum per variable
+        structure, checksums = {}, {}
+        for group in ["results", "inputs"]:
+            with xr.open_dataset(self.path, group=group) as ds:
+                structure[group] = (
+                    sorted(ds.data_vars),
+                    {k: v.to_list() for k, v in ds.indexes.items()},
+                )
+                for var in ds.data_vars:
+                    checksums[var] = _checksum(ds[var].load())
+        return structure, checksums
+
+    def read_changes(self) -> dict:
+        """
+        Compares the model file against the checksums recorded when it was last
+        (re)loaded, and returns the changes for `apply_changes`. Only reads the
+        file, so that it can run outside the thread that serves sessions.
+
+        """
+        if not self.tracking_changes:
+            raise RuntimeError("Call track_changes() first")
+        identity = self.file_identity()
+        structure, checksums = self._read_checksums()
+        with xr.open_dataset(self.path, group="attrs") as ds:
+            attrs = dict(ds.attrs)
+        calliope.io._deserialise(attrs)
+        changed = [
+            var for var in checksums if checksums[var] != self._checksums.get(var)
+        ]
+        return dict(
+            identity=identity,
+            structure=structure,
+            checksums=checksums,
+            attrs=attrs,
+            changed=changed,
+            full=(
+                structure != self._structure
+                or any(var in self.PINNED_VARIABLES for var in changed)
+            ),
+        )
+
+    def apply_changes(self, changes: dict) -> List[str]:
+        """
+        Applies changes returned by `read_changes`: the whole model is reloaded
+        if its structure (variables or coordinates) or a variable the UI depends
+        on changed. Otherwise, only changed variables and the data derived from
+        them are dropped, to be reloaded from file on demand, while cached data
+        for unchanged variables stays valid. Returns the changed variables.
+
+        """
+        if changes["full"]:
+            self._load()
+        else:
+            for var in changes["changed"]:
+                self.unload(var)
+            attrs = calliope.model.CalliopeAttrs(**changes["attrs"])
+            for attr in ["definition", "config", "math", "runtime"]:
+                setattr(self.model, attr, getattr(attrs, attr))
+            groupings = {
+                name.split(":", 1)[1]
+                for name in self.tech_groupings
+                if name.startswith("transmission:")
+            }
+            if groupings.intersection(changes["changed"]):
+                self._cubes.clear()
+            self._network = None
+        self.loaded_file_identity = changes["identity"]
+        self._structure = changes["structure"]
+        self._checksums = changes["checksums"]
+        if changes["full"] or changes["changed"]:
+            self._bump_revision(structure=changes["full"])
+        return changes["changed"]
+
+    def _bump_revision(self, structure: bool = False) -> None:
+        self.revision += 1
+        if structure:
+            self.structure_revision += 1
+
+    def cached(
+        self, name: str, query: dict, compute, variables: List[str] | None = None
+    ) -> pd.DataFrame:
+        """
+        Returns the data frame computed by `compute()`, looking it up in
+        `self.result_cache` first, if there is one.
+
+        Args:
+            name (str): Name of the computation.
+            query (dict): JSON-serialisable arguments that, together with the
+                content of the model file, determine the result.
+            compute (callable): Function returning the data frame.
+            variables (list, optional): Variables the result is computed from.
+                While changes are tracked, entries are keyed by the checksums
+                of these variables rather than of the whole model file, so
+                that they stay valid when other variables change.
+
+        """
+        if self.result_cache is None:
+            return compute()
+        if variables is not None and self.tracking_changes:
+            source = [self._checksums[var] for var in variables]
+        else:
+            source = self.result_cache.file_hash(self.path)
+        key = self.result_cache.key(source, name, query)
+        with timer("result_cache.get", name=name):
+            df = self.result_cache.get(key)
+        if df is None:
+            df = compute()
+            with timer("result_cache.put", name=name):
+                self.result_cache.put(key, df)
+        return df
+
+    @property
+    def network(self) -> "NetworkIndex":
+        """
+        The (lazily built) `NetworkIndex` of transmission links.
+
+        """
+        if self._network is None:
+            with timer("network.build"):
+                self._network = NetworkIndex(self)
+        return self._network
 
     def get_model_coords(self, ignore=["timesteps", "techs"]):
         coords = list(self.model.results.coords)
@@ -144,25 +743,544 @@ class ModelContainer:
             return name
 
 
-def filter_selectors(
-    da: xr.DataArray, selectors: Dict[str, List[str]], additional_subset: Dict = None
-) -> Dict[str, List[str]]:
-    for k, v in selectors.items():
-        assert isinstance(v, list)
+class Selection:
+    """
+    Sidebar state resolved to integer positions along the model coordinates.
 
-    selector_keys_to_delete = [
-        k for k in selectors.keys() if k not in da.dims or selectors[k] is None
-    ]
-    selectors = {k: v for k, v in selectors.items() if k not in selector_keys_to_delete}
+    Only dimensions that are not fully selected are stored, so that applying
+    a selection skips indexing along them entirely.
+
+    Args:
+        indexes (dict): Mapping of coordinate name to its `pd.Index`.
+        selectors (dict): Mapping of coordinate name to a list of selected
+            labels. Coordinates not in `indexes` and None values are ignored.
+
+    """
+
+    def __init__(
+        self,
+        indexes: Dict[str, pd.Index],
+        selectors: Dict[str, List[str]] | None = None,
+    ):
+        self.indexes = indexes
+        self.positions = {}
+        for dim, members in (selectors or {}).items():
+            if members is not None and dim in indexes:
+                self._set_positions(dim, self._resolve(dim, members))
+
+    def _resolve(self, dim: str, members: List[str]) -> np.ndarray:
+        positions = self.indexes[dim].get_indexer(list(members))
+        return np.unique(positions[positions >= 0])
+
+    def _set_positions(self, dim: str, positions: np.ndarray) -> None:
+        if len(positions) < len(self.indexes[dim]):
+            self.positions[dim] = positions
+        else:
+            self.positions.pop(dim, None)
+
+    def is_full(self, dim: str) -> bool:
+        return dim not in self.positions
+
+    def members(self, dim: str) -> pd.Index:
+        if self.is_full(dim):
+            return self.indexes[dim]
+        else:
+            return self.indexes[dim][self.positions[dim]]
+
+    def mask(self, dim: str) -> np.ndarray:
+        mask = np.zeros(len(self.indexes[dim]), dtype=bool)
+        mask[self.positions.get(dim, slice(None))] = True
+        return mask
+
+    def restrict(self, dim: str, members: List[str]) -> "Selection":
+        """
+        Returns a new selection further restricted to `members` along `dim`.
+
+        """
+        selection = Selection(self.indexes)
+        selection.positions = dict(self.positions)
+        positions = self._resolve(dim, members)
+        if not self.is_full(dim):
+            positions = np.intersect1d(positions, self.positions[dim])
+        selection._set_positions(dim, positions)
+        return selection
+
+    def key(self) -> Dict[str, str]:
+        """
+        Returns a digest of the selected members along every dimension that is
+        not fully selected, for use in cache keys. Members are hashed by label,
+        as their positions shift when members are added to the coordinates.
 
-    if additional_subset:
-        for k, v in additional_subset.items():
-            if k in selectors:
-                selectors[k] = [i for i in v if i in selectors[k]]
+        """
+        return {
+            dim: hashlib.sha256(
+                pd.util.hash_array(self.members(dim).to_numpy()).tobytes()
+            ).hexdigest()
+            for dim in sorted(self.positions)
+        }
+
+    def without(self, dim: str) -> "Selection":
+        selection = Selection(self.indexes)
+        selection.positions = {k: v for k, v in self.positions.items() if k != dim}
+        return selection
+
+    def isel(self, obj: xr.DataArray | xr.Dataset) -> xr.DataArray | xr.Dataset:
+        """
+        Applies the selection to `obj` by positional indexing, falling back to
+        label-based indexing along any dimension whose index differs from the
+        model coordinates.
+
+        """
+        indexers = {}
+        labels = {}
+        for dim, positions in self.positions.items():
+            if dim not in obj.dims:
+                continue
+            index = obj.indexes[dim]
+            if index is self.indexes[dim] or index.equals(self.indexes[dim]):
+                indexers[dim] = positions
             else:
-                selectors[k] = v
+                labels[dim] = [i for i in self.members(dim) if i in index]
+        if indexers:
+            obj = obj.isel(indexers)
+        if labels:
+            obj = obj.sel(labels)
+        return obj
+
+
+class AggregateCube:
+    """
+    Materialised aggregates of a single variable.
+
+    Keeps the non-NaN values of the variable as a long-format series, so that
+    filtering becomes a mask over the precomputed index codes, and computes partial
+    sums per group of members (e.g. techs per `base_tech`) on first use, so that
+    summing over a dimension combines a handful of partial sums instead of
+    rescanning every member.
+
+    Args:
+        da (xr.DataArray): The variable to aggregate.
+        groupings (dict): Mapping of dimension to named groupings, each of which
+            maps group names to lists of members. The dictionaries are kept by
+            reference, so groupings added later are picked up.
+        workers (int): Number of threads across which sums are split.
+
+    """
+
+    def __init__(
+        self,
+        da: xr.DataArray,
+        groupings: Dict[str, Dict[str, Dict[str, List[str]]]] | None = None,
+        workers: int = 1,
+    ):
+        self.da = da
+        self.groupings = groupings if groupings is not None else {}
+        self.workers = workers
+        self._series = None
+        self._partials = {}
+        self._gaps = {}
+
+    def nbytes(self, include_data: bool = False) -> int:
+        """
+        Returns the bytes taken up by the materialised aggregates, and by the
+        underlying data if `include_data` is True (e.g. for derived variables).
+
+        """
+        nbytes = sum(partial.nbytes for partial in self._partials.values())
+        if self._series is not None:
+            nbytes += self._series.memory_usage(index=True)
+        if include_data:
+            nbytes += self.da.nbytes
+        return nbytes
+
+    @property
+    def series(self) -> pd.Series:
+        if self._series is None:
+            self._series = self.da.to_series().dropna()
+        return self._series
+
+    def select(self, selection: Selection) -> pd.Series:
+        """
+        Returns the non-NaN values of the variable that match `selection`.
+
+        """
+        series = self.series
+        index = series.index
+        mask = np.ones(len(series), dtype=bool)
+        for dim in selection.positions:
+            if dim not in index.names:
+                continue
+            if isinstance(index, pd.MultiIndex):
+                level = index.names.index(dim)
+                wanted = self._level_mask(index.levels[level], selection, dim)
+                codes = index.codes[level]
+                # Codes of -1 denote missing labels, which are never selected
+                mask &= np.where(codes >= 0, wanted[codes], False)
+            else:
+                mask &= self._level_mask(index, selection, dim)
+        return series[mask]
+
+    @staticmethod
+    def _level_mask(level: pd.Index, selection: Selection, dim: str) -> np.ndarray:
+        if level.equals(selection.indexes[dim]):
+            return selection.mask(dim)
+        else:
+            return level.isin(selection.members(dim))
+
+    def has_gaps(self, dim: str) -> bool:
+        """
+        Returns whether any series of the variable along `dim` has values at
+        some of its positions but not at others.
+
+        """
+        if dim not in self._gaps:
+            counts = self.da.notnull().sum(dim)
+            self._gaps[dim] = bool(((counts > 0) & (counts < self.da.sizes[dim])).any())
+        return self._gaps[dim]
+
+    def _partial(self, dim: str, name: str) -> xr.DataArray:
+        key = (dim, name)
+        if key not in self._partials:
+            if name == "__all__":
+                self._partials[key] = self._sum(self.da, dim).expand_dims(
+                    {dim + "_group": ["__all__"]}
+                )
+            else:
+                groups = self.groupings[dim][name]
+                existing = set(self.da[dim].to_index())
+                labels = list(groups.keys())
+                self._partials[key] = xr.concat(
+                    [
+                        self._sum(
+                            self.da.sel({dim: [i for i in groups[g] if i in existing]}),
+                            dim,
+                        )
+                        for g in labels
+                    ],
+                    dim=pd.Index(labels, name=dim + "_group"),
+                )
+        return self._partials[key]
+
+    def _cover(self, dim: str, members: set | None):
+        # Find the grouping that covers `members` with the fewest terms to add
+        if members is None:
+            return ("__all__", ["__all__"], [])
+
+        all_members = self.da[dim].to_index()
+        candidates = {"__all__": {"__all__": list(all_members)}}
+        candidates.update(self.groupings.get(dim, {}))
+
+        best = (None, [], [i for i in all_members if i in members])
+        for name, groups in candidates.items():
+            full_groups = [
+                g
+                for g, group_members in groups.items()
+                if len(group_members) > 0 and all(i in members for i in group_members)
+            ]
+            covered = set(i for g in full_groups for i in groups[g] if i in members)
+            # Groups may overlap, in which case this grouping cannot be used
+            if sum(len(groups[g]) for g in full_groups) != len(covered):
+                continue
+            rest = [i for i in all_members if i in members and i not in covered]
+            if len(full_groups) + len(rest) < len(best[1]) + len(best[2]):
+                best = (name, full_groups, rest)
+        return best
+
+    def sum(self, dim: str, selection: Selection) -> xr.DataArray:
+        """
+        Sums the variable over the members of `dim` that are in `selection`,
+        after applying `selection` along the other dimensions.
+
+        """
+        others = selection.without(dim)
+        members = None if selection.is_full(dim) else set(selection.members(dim))
+
+        name, full_groups, rest = self._cover(dim, members)
+
+        terms = []
+        if full_groups:
+            group_dim = dim + "_group"
+            terms.append(
+                self._sum(
+                    others.isel(self._partial(dim, name).sel({group_dim: full_groups})),
+                    group_dim,
+                )
+            )
+        if rest or not terms:
+            positions = self.da.indexes[dim].get_indexer(rest)
+            terms.append(self._sum(others.isel(self.da.isel({dim: positions})), dim))
+
+        return sum(terms[1:], terms[0])
+
+    def _sum(self, da: xr.DataArray, dim: str) -> xr.DataArray:
+        return map_blocks(lambda block: block.sum(dim), da, [dim], self.workers)
+
+
+class NetworkIndex:
+    """
+    Topology of the transmission network, built once per model.
+
+    Every transmission tech defined at exactly two nodes is a link, running from
+    the first to the second of these nodes in model order. Link geometry and
+    groupings of links by an input parameter are computed on first use and
+    cached.
+
+    Args:
+        model_container (ModelContainer)
+
+    """
+
+    def __init__(self, model_container: ModelContainer):
+        self.model_container = model_container
+        data = model_container.combined_data
+        self.nodes = model_container.coord_indexes["nodes"]
+        self.techs = pd.Index(
+            model_container.get_base_tech_members("transmission"), name="techs"
+        )
+
+        defined = data.definition_matrix.sel(techs=list(self.techs)).fillna(False)
+        at_nodes = defined.any("carriers").transpose("techs", "nodes").values
+        is_link = at_nodes.sum(axis=1) == 2
+        at_nodes = at_nodes[is_link]
+
+        self.links = self.techs[is_link]
+        self.node_from = at_nodes.argmax(axis=1)
+        self.node_to = at_nodes.shape[1] - 1 - at_nodes[:, ::-1].argmax(axis=1)
+        self.carriers = (
+            defined.any("nodes")
+            .transpose("techs", "carriers")
+            .values[is_link]
+            .astype(bool)
+        )
+
+        self._node_coords = {
+            False: (data.longitude.values, data.latitude.values),
+            True: None,
+        }
+        self._groups = {}
+
+    def node_coords(self, as_mercator: bool = False):
+        if self._node_coords[as_mercator] is None:
+            self._node_coords[as_mercator] = LONLAT_TO_MERCATOR.transform(
+                *self._node_coords[False]
+            )
+        return self._node_coords[as_mercator]
+
+    def mask(self, selection: "Selection | None" = None) -> np.ndarray:
+        """
+        Returns which links are in `selection`, i.e. are selected techs with
+        both ends at selected nodes and at least one selected carrier.
+
+        """
+        mask = np.ones(len(self.links), dtype=bool)
+        if selection is None:
+            return mask
+        if not selection.is_full("nodes"):
+            nodes = selection.mask("nodes")
+            mask &= nodes[self.node_from] & nodes[self.node_to]
+        if not selection.is_full("techs"):
+            mask &= self.links.isin(selection.members("techs"))
+        if "carriers" in selection.indexes and not selection.is_full("carriers"):
+            mask &= self.carriers[:, selection.mask("carriers")].any(axis=1)
+        return mask
+
+    def line_xs_ys(
+        self, as_mercator: bool = False, selection: "Selection | None" = None
+    ) -> pd.DataFrame:
+        """
+        Returns the line coordinates and end nodes of the links in `selection`.
+
+        """
+        mask = self.mask(selection)
+        node_from, node_to = self.node_from[mask], self.node_to[mask]
+        x, y = self.node_coords(as_mercator)
+        return pd.DataFrame(
+            {
+                "xs": np.stack([x[node_from], x[node_to]], axis=1).tolist(),
+                "ys": np.stack([y[node_from], y[node_to]], axis=1).tolist(),
+                "node_from": self.nodes[node_from],
+                "node_to": self.nodes[node_to],
+            },
+            index=self.links[mask],
+        )
+
+    def groups(self, group_param: str | None = None) -> Dict[str, List[str]]:
+        """
+        Returns the transmission techs grouped by their value of the input
+        parameter `group_param`. Without a valid `group_param` (an input
+        parameter over techs only), every tech is its own group.
+
+        """
+        catalog = self.model_container.catalog.get(group_param, {})
+        if catalog.get("group") != "inputs" or catalog.get("dims") != ("techs",):
+            group_param = None
+        if group_param not in self._groups:
+            if group_param is None:
+                groups = {i: [i] for i in self.techs}
+            else:
+                values = (
+                    self.model_container.get_dataarray(group_param)
+                    .sel(techs=list(self.techs))
+                    .to_series()
+                )
+                groups = {k: list(v) for k, v in values.groupby(values).groups.items()}
+            self._groups[group_param] = groups
+        return self._groups[group_param]
+
 
-    return selectors
+class ClusteredTimeline:
+    """
+    Full timeline of a model solved with time clustering, whose timeseries
+    only cover the timesteps of its representative days.
+
+    Every day of the full timeline (`datesteps`) is mapped to the timesteps of
+    the representative day of its cluster by an index, through which data
+    over the representative timesteps is expanded to the full timeline, or
+    resampled to days or longer from the daily means of the representative
+    days without expanding it.
+
+    Args:
+        inputs (xr.Dataset): Model inputs with `timestep_cluster` and
+            `lookup_datestep_cluster`.
+
+    """
+
+    def __init__(self, inputs: xr.Dataset):
+        representative = inputs.timesteps.to_index()
+        self.timestep_cluster = inputs.timestep_cluster.values.astype(int)
+        self.datestep_cluster = inputs.lookup_datestep_cluster.values.astype(int)
+        self.datesteps = inputs.datesteps.to_index()
+
+        # Positions of the timesteps of every cluster, one cluster after the other
+        order = np.argsort(self.timestep_cluster, kind="stable")
+        n_clusters = max(self.timestep_cluster.max(), self.datestep_cluster.max()) + 1
+        sizes = np.bincount(self.timestep_cluster, minlength=n_clusters)
+        starts = np.cumsum(sizes) - sizes
+
+        day_sizes = sizes[self.datestep_cluster]
+        day_starts = np.cumsum(day_sizes) - day_sizes
+        within_day = np.arange(day_sizes.sum()) - np.repeat(day_starts, day_sizes)
+        self.index = order[
+            np.repeat(starts[self.datestep_cluster], day_sizes) + within_day
+        ]
+        time_of_day = (representative - representative.normalize())[self.index]
+        self.timesteps = pd.DatetimeIndex(
+            np.repeat(self.datesteps.to_numpy(), day_sizes) + time_of_day,
+            name="timesteps",
+        )
+
+    @classmethod
+    def from_inputs(cls, inputs: xr.Dataset) -> "ClusteredTimeline | None":
+        """
+        Returns the full timeline of a model with the given `inputs`, or None if
+        it was not solved with time clustering.
+
+        """
+        if "lookup_datestep_cluster" not in inputs or "timestep_cluster" not in inputs:
+            return None
+        return cls(inputs)
+
+    def expand(self, da: xr.DataArray, time_subset=None) -> xr.DataArray:
+        """
+        Returns `da` over the full timeline, from `time_subset[0]` to
+        `time_subset[1]` if given.
+
+        """
+        index, timesteps = self.index, self.timesteps
+        if time_subset:
+            subset = timesteps.slice_indexer(*time_subset)
+            index, timesteps = index[subset], timesteps[subset]
+        return da.isel(timesteps=index).assign_coords(timesteps=timesteps)
+
+    def resample(self, da: xr.DataArray, rule: str, workers: int = 1) -> xr.DataArray:
+        """
+        Returns the means of `da` over the full timeline resampled to `rule`, a
+        frequency of one day or longer. They are computed from the daily means
+        of the representative days, which equal those over the expanded
+        timesteps as long as every timestep of a series has a value or none
+        does.
+
+        """
+        clusters = xr.DataArray(
+            self.timestep_cluster, dims="timesteps", name="clusters"
+        )
+        daily = (
+            da.groupby(clusters)
+            .mean()
+            .sel(clusters=self.datestep_cluster)
+            .rename(clusters="timesteps")
+            .assign_coords(timesteps=self.datesteps.rename("timesteps"))
+            .transpose(*da.dims)
+        )
+        return map_blocks(
+            lambda block: block.resample(timesteps=rule).mean(),
+            daily,
+            ["timesteps"],
+            workers,
+        )
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(workers: int) -> ThreadPoolExecutor:
+    """
+    Returns the thread pool shared by all callers, which is created with
+    `workers` threads on first use and kept for the life of the process.
+    Callers asking for another number of threads share the same pool, as
+    replacing it could shut it down under other callers.
+
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(workers, thread_name_prefix="calligraph")
+        return _executor
+
+
+def map_blocks(
+    func, da: xr.DataArray, reduced: List[str], workers: int = 1
+) -> xr.DataArray:
+    """
+    Returns `func(da)`, where `func` reduces `da` over the `reduced` dimensions
+    only, computed in parallel by `workers` threads on blocks of `da` along its
+    longest other dimension. As every block is reduced exactly as it would be
+    as part of `da`, the result is identical to the serial one.
+
+    NumPy releases the GIL while reducing arrays, so that the threads run on
+    separate cores without copying data between processes.
+
+    """
+    dims = [dim for dim in da.dims if dim not in reduced]
+    if not dims:
+        return func(da)
+    dim = max(dims, key=lambda i: da.sizes[i])
+    n_blocks = min(workers, da.sizes[dim])
+    if n_blocks < 2:
+        return func(da)
+    bounds = np.linspace(0, da.sizes[dim], n_blocks + 1).astype(int)
+    blocks = [da.isel({dim: slice(a, b)}) for a, b in zip(bounds[:-1], bounds[1:])]
+    return xr.concat(list(get_executor(workers).map(func, blocks)), dim=dim)
+
+
+def get_process_rss() -> int | None:
+    """
+    Returns the resident set size of the current process in bytes, or None if
+    it cannot be determined on this platform.
+
+    """
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
 
 
 def _clean_df(df):
@@ -188,6 +1306,12 @@ def get_model_summary_df(model_container):
         ("Timesteps", len(results.timesteps)),
         ("Termination condition", model.runtime.termination_condition),
     ]
+    if model_container.timeline is not None:
+        timeline = model_container.timeline
+        data[-1:-1] = [
+            ("Representative days", len(np.unique(timeline.datestep_cluster))),
+            ("Timesteps (full timeline)", len(timeline.timesteps)),
+        ]
     df = pd.DataFrame(data).set_index(0)
     return _clean_df(df)
 
@@ -204,20 +1328,118 @@ def get_solve_config_df(model_container):
     return _clean_df(df)
 
 
+def series_to_frame(
+    series: pd.Series, model_container: ModelContainer, variable: str
+) -> pd.DataFrame:
+    """
+    Returns `series` as a data frame with a column per index level and a
+    `variable` column, with the dtypes set by `model_container.compact` and
+    `model_container.float32`.
+
+    """
+    if model_container.compact:
+        # Categorical columns are built straight from the codes of the index,
+        # without materialising a label per row
+        index = series.index
+        if not isinstance(index, pd.MultiIndex):
+            index = pd.MultiIndex.from_arrays([index])
+        columns = {}
+        for i, (name, level) in enumerate(zip(index.names, index.levels)):
+            if level.dtype == object:
+                columns[name] = pd.Categorical.from_codes(
+                    index.codes[i], level.rename(None)
+                )
+            else:
+                columns[name] = index.get_level_values(i)
+        columns[variable] = series.to_numpy()
+        df = pd.DataFrame(columns)
+    else:
+        df = series.to_frame(variable).reset_index()
+    if model_container.float32:
+        df[variable] = df[variable].astype(np.float32)
+    return df
+
+
+def _frame_format(model_container):
+    # Options that change the dtypes of extracted data frames, for cache queries
+    return dict(compact=model_container.compact, float32=model_container.float32)
+
+
+def source_variables(variable):
+    """
+    Returns the variables of the model data that `variable` is computed from.
+
+    """
+    return ["flow_out", "flow_in"] if variable == "flow*" else [variable]
+
+
+def _checksum(da: xr.DataArray) -> str:
+    # Covers dimensions, coordinate labels and values
+    sha256 = hashlib.sha256(repr((da.dims, str(da.dtype), da.shape)).encode())
+    for dim in da.dims:
+        if dim in da.indexes:
+            sha256.update(pd.util.hash_array(da.indexes[dim].to_numpy()))
+    values = da.values
+    if values.dtype == object:
+        sha256.update(pd.util.hash_array(values.ravel()))
+    else:
+        sha256.update(np.ascontiguousarray(values))
+    return sha256.hexdigest()
+
+
+@timed()
 def get_df_static(model_container, variable, selectors):
-    da = model_container.combined_data[variable]
-
-    df_capacity = (
-        da.sel(filter_selectors(da, selectors))
-        .to_series()
-        .where(lambda x: x != 0)
-        .dropna()
-        .to_frame(variable)
-        .reset_index()
+    selection = model_container.get_selection(selectors)
+
+    def compute():
+        return (
+            model_container.get_cube(variable)
+            .select(selection)
+            .where(lambda x: x != 0)
+            .dropna()
+            .pipe(series_to_frame, model_container, variable)
+        )
+
+    return model_container.cached(
+        "get_df_static",
+        dict(
+            variable=variable,
+            selection=selection.key(),
+            **_frame_format(model_container),
+        ),
+        compute,
+        variables=source_variables(variable),
+    )
+
+
+def timeseries_query(
+    model_container,
+    variable,
+    selectors,
+    time_subset=None,
+    resample=None,
+    sum_by="nodes",
+) -> dict:
+    """
+    Returns the normalised query of `get_df_timeseries` with the same
+    arguments, by which results derived from its data frame can be cached.
+
+    """
+    selection = model_container.get_selection(selectors)
+    query = dict(
+        variable=variable,
+        selection=selection.key(),
+        time_subset=[str(i) for i in time_subset] if time_subset else None,
+        resample=resample,
+        sum_by=sum_by,
+        **_frame_format(model_container),
     )
-    return df_capacity
+    if model_container.timeline is not None:
+        query["timeline"] = "full"
+    return query
 
 
+@timed()
 def get_df_timeseries(
     model_container,
     variable,
@@ -226,33 +1448,81 @@ def get_df_timeseries(
     resample=None,
     sum_by="nodes",
 ):
-    results = model_container.combined_data
+    selection = model_container.get_selection(selectors)
+    return model_container.cached(
+        "get_df_timeseries",
+        timeseries_query(
+            model_container, variable, selectors, time_subset, resample, sum_by
+        ),
+        lambda: _get_df_timeseries(
+            model_container, variable, selection, time_subset, resample, sum_by
+        ),
+        variables=source_variables(variable),
+    )
 
-    if variable == "flow*":
-        da = results.flow_out.fillna(0) - results.flow_in.fillna(0)
-    else:
-        da = results[variable]
 
-    da_ = da.sel(filter_selectors(da, selectors))
+def _get_df_timeseries(
+    model_container, variable, selection, time_subset, resample, sum_by
+):
+    cube = model_container.get_cube(variable)
 
-    if resample:
-        da_ = da_.resample(timesteps=resample).mean()
+    # Summing first lets the cube combine its precomputed partial sums,
+    # so that the resample only has to deal with the reduced array. As the
+    # resampled means skip NaN, this only gives the sum of the means of every
+    # series if none of them has gaps, otherwise the sum has to come last.
+    gaps = bool(resample) and cube.has_gaps("timesteps")
+    sum_first = sum_by in cube.da.dims and not gaps
+    with timer("get_df_timeseries.select_sum"):
+        if sum_first:
+            da_ = cube.sum(sum_by, selection)
+        else:
+            da_ = selection.isel(cube.da)
+
+    # For clustered models, only the selected data is expanded to the full
+    # timeline, and only over the time subset
+    timeline = model_container.timeline
+    if resample and timeline is not None and not gaps:
+        with timer("get_df_timeseries.resample"):
+            da_ = timeline.resample(da_, resample, model_container.workers)
+    else:
+        if timeline is not None:
+            with timer("get_df_timeseries.expand"):
+                da_ = timeline.expand(da_, None if resample else time_subset)
+        if resample:
+            with timer("get_df_timeseries.resample"):
+                da_ = map_blocks(
+                    lambda block: block.resample(timesteps=resample).mean(),
+                    da_,
+                    ["timesteps"],
+                    model_container.workers,
+                )
 
     if time_subset:
         da_ = da_.sel(timesteps=slice(*time_subset))
 
     if sum_by in da_.dims:
-        da_ = da_.sum(sum_by)
+        with timer("get_df_timeseries.sum"):
+            da_ = map_blocks(
+                lambda block: block.sum(sum_by), da_, [sum_by], model_container.workers
+            )
 
-    df = da_.to_series().to_frame(variable)
+    with timer("get_df_timeseries.to_frame"):
+        df = series_to_frame(da_.to_series(), model_container, variable)
 
-    return df.reset_index()
+    return df
 
 
+@timed()
 def get_generic_df(model_container, variable, dropna=False, **selectors):
-    da = model_container.combined_data[variable]
+    da = model_container.get_dataarray(variable)
 
-    df = da.sel(filter_selectors(da, selectors)).to_dataframe()
+    da = model_container.get_selection(selectors).isel(da)
+    if model_container.compact or model_container.float32:
+        df = series_to_frame(da.to_series(), model_container, da.name).set_index(
+            list(da.dims)
+        )
+    else:
+        df = da.to_dataframe()
     if dropna:
         df = df.dropna()
 
@@ -1,22 +1,31 @@
 from typing import Callable, Literal
 
-import calliope
+import numpy as np
 import pandas as pd
 import panel as pn
-import xyzservices.providers as xyz
-from bokeh.models import ColumnDataSource, HoverTool, TapTool
+from bokeh.events import RangesUpdate
+from bokeh.layouts import column, row
+from bokeh.models import (
+    ColumnDataSource,
+    CustomJS,
+    Div,
+    HoverTool,
+    Slider,
+    TapTool,
+    Toggle,
+    WMTSTileSource,
+)
 from bokeh.plotting import figure
-from pyproj import Transformer
 
-from calligraph.core import filter_selectors
+from calligraph.core import LONLAT_TO_MERCATOR, ModelContainer, Selection
+from calligraph.perf import timed, timer
+from calligraph.plot import data_timeseries
+from calligraph.selector import CoordSelector
+from calligraph.tiles import DEFAULT_PROVIDER, tile_url
 
-# Transform from Web Mercator to Lat/Lon
-# `always_xy` ensures that the order of the resulting tuple remains (horizontal axis, vertical axis), irrespective of the CRS.
-LONLAT_TO_MERCATOR = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
 
-
-def get_geo_bounds(model: calliope.Model, as_mercator=False, padding=0.1):
-    df = get_nodes_geo(model, as_mercator=False)
+def get_geo_bounds(model_container: ModelContainer, as_mercator=False, padding=0.1):
+    df = get_nodes_geo(model_container, as_mercator=False)
     bounds = df.loc[:, ["longitude", "latitude"]].describe().loc[["min", "max"], :].T
     if padding:
         padding_absolute = (bounds["max"] - bounds["min"]).max() * padding
@@ -28,43 +37,33 @@ def get_geo_bounds(model: calliope.Model, as_mercator=False, padding=0.1):
         return bounds
 
 
-def get_nodes_geo(model, as_mercator=False, selectors=None):
-    nodes = model.inputs[["nodes", "longitude", "latitude"]]
+@timed()
+def get_nodes_geo(
+    model_container: ModelContainer,
+    as_mercator=False,
+    selection: Selection | None = None,
+):
+    nodes = model_container.combined_data[["nodes", "longitude", "latitude"]]
 
-    if selectors:
-        nodes = nodes.sel(filter_selectors(nodes, selectors))
+    if selection is not None:
+        nodes = selection.isel(nodes)
 
     nodes = nodes.to_dataframe()
     if as_mercator:
-        updated = nodes.apply(_to_mercator, axis=1)
-        return updated
+        return _df_to_mercator(nodes)
     else:
         return nodes
 
 
-def get_line_xs_ys(model, as_mercator: bool = False, selectors: dict | None = None):
-    da = model.inputs.sel(**selectors) if selectors is not None else model.inputs
-    links = (
-        da.sel(**selectors)[["longitude", "latitude"]]
-        .where(da.definition_matrix & da.base_tech.isin("transmission"))
-        .to_dataframe()
-        .droplevel("carriers")
-        .dropna()
+@timed()
+def get_line_xs_ys(
+    model_container: ModelContainer,
+    as_mercator: bool = False,
+    selection: Selection | None = None,
+):
+    return model_container.network.line_xs_ys(
+        as_mercator=as_mercator, selection=selection
     )
-    if as_mercator:
-        links = links.apply(_to_mercator, axis=1)
-    grouped_links = links.groupby("techs", group_keys=False).apply(
-        lambda x: pd.Series(
-            {
-                "xs": x.longitude.to_list(),
-                "ys": x.latitude.to_list(),
-                "node_from": x.index.get_level_values("nodes")[0],
-                "node_to": x.index.get_level_values("nodes")[1],
-            }
-        )
-    )
-
-    return grouped_links
 
 
 def _to_mercator(row: pd.Series) -> pd.Series:
@@ -72,105 +71,374 @@ def _to_mercator(row: pd.Series) -> pd.Series:
     return pd.Series(data=transformed, index=["longitude", "latitude"])
 
 
+def _df_to_mercator(df: pd.DataFrame) -> pd.DataFrame:
+    # Transforms all rows at once rather than row by row
+    longitude, latitude = LONLAT_TO_MERCATOR.transform(
+        df["longitude"].to_numpy(), df["latitude"].to_numpy()
+    )
+    return pd.DataFrame({"longitude": longitude, "latitude": latitude}, index=df.index)
+
+
+@timed()
+def get_geo_values(
+    model_container: ModelContainer,
+    techs: list[str],
+    variable: str,
+    selection: Selection,
+    unstack_dim: Literal["nodes", "techs"],
+) -> pd.DataFrame:
+    """
+    Returns the values of `variable` with one row per member of `unstack_dim`
+    and the remaining dimensions as (multi-indexed) columns.
+
+    """
+    cube = model_container.get_cube(variable)
+    return cube.select(selection.restrict("techs", techs)).unstack(unstack_dim).T
+
+
+def get_geo_html(values: pd.DataFrame, variable: str) -> pd.Series:
+    """
+    Returns the tooltip HTML for every row of `values`, as returned by
+    `get_geo_values`.
+
+    """
+    if values.empty:
+        return pd.Series(index=values.index, dtype=object)
+    return values.apply(lambda row: row.dropna().to_frame(variable).to_html(), axis=1)
+
+
+@timed()
 def get_geo_data(
-    model: calliope.Model,
+    model_container: ModelContainer,
     techs: list[str],
     variable: str,
     selectors: dict[str, list[str]],
     unstack_dim: Literal["nodes", "techs"],
     concat_func: Callable,
 ) -> pd.DataFrame:
-    da = (
-        model.results[variable] if variable in model.results else model.inputs[variable]
-    )
-    df = (
-        da.sel(filter_selectors(da, selectors, additional_subset={"techs": techs}))
-        .to_series()
-        .unstack(unstack_dim)
-    )
-    html_strings = df.apply(lambda row: row.dropna().to_frame(variable).to_html())
-    df.index = df.index.map("{0[0]}__{0[1]}".format)
+    selection = model_container.get_selection(selectors)
+    with timer("get_geo_data.select"):
+        df = get_geo_values(model_container, techs, variable, selection, unstack_dim)
+    with timer("get_geo_data.html"):
+        html_strings = get_geo_html(df, variable)
+    df.columns = df.columns.map("{0[0]}__{0[1]}".format)
     df = pd.concat(
         [
-            concat_func(model, as_mercator=True, selectors=selectors),
-            df.T,
+            concat_func(model_container, as_mercator=True, selection=selection),
+            df,
             html_strings.to_frame("html"),
         ],
         axis=1,
     )
     if unstack_dim == "techs":
-        df["color"] = model.inputs.color.sel(techs=techs)
+        df["color"] = model_container.combined_data.color.to_series().reindex(df.index)
     return df
 
 
+class SpatialIndex:
+    """
+    Index over point coordinates, kept sorted along x so that the points within
+    a rectangle are found with a binary search on x and a filter on y.
+
+    Args:
+        x (np.ndarray): Horizontal coordinates.
+        y (np.ndarray): Vertical coordinates.
+
+    """
+
+    def __init__(self, x: np.ndarray, y: np.ndarray):
+        self.order = np.argsort(x, kind="stable")
+        self.x = np.asarray(x)[self.order]
+        self.y = np.asarray(y)[self.order]
+
+    def query(self, x0: float, x1: float, y0: float, y1: float) -> np.ndarray:
+        """
+        Returns the sorted positions of the points within the given rectangle.
+
+        """
+        start = np.searchsorted(self.x, x0, side="left")
+        end = np.searchsorted(self.x, x1, side="right")
+        y = self.y[start:end]
+        return np.sort(self.order[start:end][(y >= y0) & (y <= y1)])
+
+
+def get_cluster_labels(x: np.ndarray, y: np.ndarray, cell_size: float) -> np.ndarray:
+    """
+    Returns a cluster label for every point, grouping the points that fall into
+    the same cell of a square grid anchored at the origin.
+
+    """
+    cells = np.stack([np.floor(x / cell_size), np.floor(y / cell_size)], axis=1)
+    return np.unique(cells, axis=0, return_inverse=True)[1].ravel()
+
+
+def _segments_in_view(x_from, x_to, y_from, y_to, x0, x1, y0, y1) -> np.ndarray:
+    # Whether the bounding box of each segment intersects the view
+    return (
+        (np.maximum(x_from, x_to) >= x0)
+        & (np.minimum(x_from, x_to) <= x1)
+        & (np.maximum(y_from, y_to) >= y0)
+        & (np.minimum(y_from, y_to) <= y1)
+    )
+
+
+def map_figure(ui_view, viewport, sizing_mode="scale_both"):
+    """
+    Returns an empty map figure showing `viewport` (x0, x1, y0, y1, in web
+    mercator coordinates), with tiles from the calligraph server if it has a
+    tile cache and from the tile provider otherwise.
+
+    """
+    # Range bounds must be supplied in web mercator coordinates
+    x0, x1, y0, y1 = viewport
+    p = figure(
+        x_range=[x0, x1],
+        y_range=[y0, y1],
+        x_axis_type="mercator",
+        y_axis_type="mercator",
+        sizing_mode=sizing_mode,
+        tools="pan,wheel_zoom,box_zoom,reset",
+        active_scroll="wheel_zoom",
+    )
+    if ui_view.tile_cache is not None:
+        # Tiles are served by the calligraph server itself
+        p.add_tile(
+            WMTSTileSource(url=tile_url(), attribution=ui_view.tile_cache.attribution)
+        )
+    else:
+        p.add_tile(DEFAULT_PROVIDER, retina=True)
+    return p
+
+
 class MapPlot:
+    """
+    Map of nodes and transmission links.
+
+    Only the nodes and links within the current view are sent to the browser,
+    and their tooltips are only rendered for those. When more than
+    `MAX_VISIBLE_NODES` nodes or `MAX_VISIBLE_LINKS` links would be visible,
+    nearby nodes are clustered on a grid. Its cells start at about
+    1/`CLUSTER_CELLS` of the view's width and are doubled until few enough
+    nodes and links remain. Cell sizes are powers of two, so that clusters stay
+    put while panning. Clusters show the number of nodes and the sum of their
+    values, and the links between two clusters are combined in the same way.
+
+    """
+
+    MAX_VISIBLE_NODES = 500
+    MAX_VISIBLE_LINKS = 500
+    CLUSTER_CELLS = 16
+    AGGREGATED_LINK_COLOR = "#888888"
+
     def __init__(self, ui_view):
         self.ui_view = ui_view
         self.df_nodes = None
         self.df_links = None
-        self.selected_nodes = pn.widgets.MultiChoice(
-            value=ui_view.coord_selectors["nodes"].value,
-            options=ui_view.coord_selectors["nodes"].value,
+        self.visible_members = []
+        self.src_nodes = None
+        self.src_links = None
+        self.selected_nodes = CoordSelector(
+            options=ui_view.coord_selectors["nodes"].value
+        )
+        self.bounds = get_geo_bounds(ui_view.model_container, as_mercator=True)
+        self.viewport = (
+            *self.bounds.loc["longitude", :].to_list(),
+            *self.bounds.loc["latitude", :].to_list(),
         )
-        self.bounds = get_geo_bounds(ui_view.model_container.model, as_mercator=True)
+        self._updating_sources = False
 
     def nodes_indices_change(self, attr, old, new):
+        if self._updating_sources:
+            return
         if len(new) > 0:
-            self.selected_nodes.value = self.df_nodes.iloc[new].index.to_list()
+            self.selected_nodes.value = [
+                node for i in new for node in self.visible_members[i]
+            ]
         else:
-            self.selected_nodes.value = self.ui_view.coord_selectors["nodes"].value
+            # All nodes, without copying their labels
+            self.selected_nodes.value = self.selected_nodes.options
+
+    def ranges_update(self, event):
+        self.viewport = (event.x0, event.x1, event.y0, event.y1)
+        self.update_sources()
+
+    @timed("MapPlot.update_sources")
+    def update_sources(self):
+        x0, x1, y0, y1 = self.viewport
+        labels = self._cluster_labels(x0, x1, y0, y1)
+        visible = self.node_index.query(x0, x1, y0, y1)
+
+        nodes = self._node_data(labels, np.unique(labels[visible]))
+        links = self._link_data(
+            labels, nodes["centroids"], nodes["names"], x0, x1, y0, y1
+        )
+
+        self._updating_sources = True
+        try:
+            self.src_nodes.data = nodes["data"]
+            self.src_links.data = links
+            if self.selected_nodes.all_selected:
+                self.src_nodes.selected.indices = []
+            else:
+                selected = set(self.selected_nodes.value)
+                self.src_nodes.selected.indices = [
+                    i
+                    for i, members in enumerate(self.visible_members)
+                    if selected.issuperset(members)
+                ]
+        finally:
+            self._updating_sources = False
+
+    def _cluster_labels(self, x0, x1, y0, y1):
+        # Labels every node with its cluster, coarsening the grid until neither
+        # too many nodes nor too many links between them remain visible
+        x = self.df_nodes.longitude.to_numpy()
+        y = self.df_nodes.latitude.to_numpy()
+        visible = self.node_index.query(x0, x1, y0, y1)
+
+        node_positions = pd.Series(np.arange(len(x)), index=self.df_nodes.index)
+        link_from = node_positions.reindex(self.df_links.node_from).to_numpy()
+        link_to = node_positions.reindex(self.df_links.node_to).to_numpy()
+        link_visible = _segments_in_view(
+            x[link_from], x[link_to], y[link_from], y[link_to], x0, x1, y0, y1
+        )
+        link_from, link_to = link_from[link_visible], link_to[link_visible]
 
+        labels = np.arange(len(x))
+        cell_size = 2 ** np.round(np.log2((x1 - x0) / self.CLUSTER_CELLS))
+        while True:
+            pairs = np.stack([labels[link_from], labels[link_to]], axis=1)
+            pairs = np.unique(pairs[pairs[:, 0] != pairs[:, 1]], axis=0)
+            if (
+                len(np.unique(labels[visible])) <= self.MAX_VISIBLE_NODES
+                and len(pairs) <= self.MAX_VISIBLE_LINKS
+            ):
+                return labels
+            labels = get_cluster_labels(x, y, cell_size)
+            cell_size *= 2
+
+    def _node_data(self, labels, visible_labels):
+        df = self.df_nodes
+        grouped = df[["longitude", "latitude"]].groupby(labels)
+        centroids = grouped.mean()
+        counts = grouped.size()
+        members = df.index.to_series().groupby(labels).agg(list)
+
+        values = self.node_values.groupby(labels).sum(min_count=1)
+        values = values.loc[visible_labels]
+        html = get_geo_html(values, self.node_variable)
+        html = [
+            h if counts[label] == 1 else f"<b>{counts[label]} nodes</b>{h}"
+            for label, h in zip(visible_labels, html)
+        ]
+
+        self.visible_members = members.loc[visible_labels].to_list()
+        data = dict(
+            longitude=centroids.longitude.loc[visible_labels].to_numpy(),
+            latitude=centroids.latitude.loc[visible_labels].to_numpy(),
+            size=15 + 5 * np.log2(counts.loc[visible_labels].to_numpy()),
+            count=counts.loc[visible_labels].to_numpy(),
+            html=html,
+        )
+        names = members.str[0].where(counts == 1, counts.astype(str) + " nodes")
+        return dict(data=data, centroids=centroids, names=names)
+
+    def _link_data(self, labels, centroids, names, x0, x1, y0, y1):
+        df = self.df_links
+        node_labels = pd.Series(labels, index=self.df_nodes.index)
+        label_from = node_labels.reindex(df.node_from).to_numpy()
+        label_to = node_labels.reindex(df.node_to).to_numpy()
+
+        # Links within a cluster are not shown, and links between the same
+        # pair of clusters are combined
+        between = label_from != label_to
+        pairs = [
+            np.minimum(label_from, label_to)[between],
+            np.maximum(label_from, label_to)[between],
+        ]
+        grouped = self.link_values[between].groupby(pairs)
+        counts = grouped.size()
+        values = grouped.sum(min_count=1)
+        first = df[between].groupby(pairs).first()
+        label_from = counts.index.get_level_values(0).to_numpy()
+        label_to = counts.index.get_level_values(1).to_numpy()
+
+        x_from = centroids.longitude.loc[label_from].to_numpy()
+        x_to = centroids.longitude.loc[label_to].to_numpy()
+        y_from = centroids.latitude.loc[label_from].to_numpy()
+        y_to = centroids.latitude.loc[label_to].to_numpy()
+        visible = _segments_in_view(x_from, x_to, y_from, y_to, x0, x1, y0, y1)
+
+        counts = counts[visible].to_numpy()
+        first = first[visible]
+        html = get_geo_html(values[visible], self.link_variable)
+        single = counts == 1
+        return dict(
+            xs=np.stack([x_from, x_to], axis=1)[visible].tolist(),
+            ys=np.stack([y_from, y_to], axis=1)[visible].tolist(),
+            node_from=np.where(single, first.node_from, names.loc[label_from[visible]]),
+            node_to=np.where(single, first.node_to, names.loc[label_to[visible]]),
+            color=np.where(single, first.color, self.AGGREGATED_LINK_COLOR),
+            html=[
+                h if n == 1 else f"<b>{n} links</b>{h}" for n, h in zip(counts, html)
+            ],
+        )
+
+    @timed("MapPlot.plot")
     def plot(self, ui_view, node_variable, link_variable, **selectors):
-        model = ui_view.model_container.model
+        model_container = ui_view.model_container
+        base_tech = model_container.base_tech
         techs_no_transmission = [
             i
             for i in ui_view.coord_selectors["techs"].value
-            if ui_view.model_container.model.inputs.base_tech.loc[i].data
-            != "transmission"
+            if base_tech.get(i) != "transmission"
         ]
         techs_transmission = [
             i
             for i in ui_view.coord_selectors["techs"].value
-            if ui_view.model_container.model.inputs.base_tech.loc[i].data
-            == "transmission"
+            if base_tech.get(i) == "transmission"
         ]
-        self.df_nodes = get_geo_data(
-            model,
-            techs_no_transmission,
-            node_variable,
-            selectors,
-            "nodes",
-            get_nodes_geo,
+        selection = model_container.get_selection(selectors)
+
+        self.node_variable = node_variable
+        self.link_variable = link_variable
+        self.df_nodes = get_nodes_geo(
+            model_container, as_mercator=True, selection=selection
+        )
+        self.node_values = get_geo_values(
+            model_container, techs_no_transmission, node_variable, selection, "nodes"
+        ).reindex(self.df_nodes.index)
+        self.df_links = get_line_xs_ys(
+            model_container, as_mercator=True, selection=selection
         )
-        self.df_links = get_geo_data(
-            model, techs_transmission, link_variable, selectors, "techs", get_line_xs_ys
+        self.df_links["color"] = (
+            model_container.combined_data.color.to_series().reindex(self.df_links.index)
         )
-        src_nodes = ColumnDataSource(self.df_nodes)
-        src_links = ColumnDataSource(self.df_links)
+        self.link_values = get_geo_values(
+            model_container, techs_transmission, link_variable, selection, "techs"
+        ).reindex(self.df_links.index)
+        self.node_index = SpatialIndex(
+            self.df_nodes.longitude.to_numpy(), self.df_nodes.latitude.to_numpy()
+        )
+
+        self.src_nodes = ColumnDataSource()
+        self.src_links = ColumnDataSource()
+        self.update_sources()
 
         tooltips_nodes = "<div>@html</div>"
         tooltips_links = "<div>@node_from → @node_to</div><div>@html</div>"
 
-        # Range bounds must be supplied in web mercator coordinates
-        p = figure(
-            x_range=self.bounds.loc["longitude", :].to_list(),
-            y_range=self.bounds.loc["latitude", :].to_list(),
-            x_axis_type="mercator",
-            y_axis_type="mercator",
-            sizing_mode="scale_both",
-            tools="pan,wheel_zoom,box_zoom,reset",
-            active_scroll="wheel_zoom",
-        )
-        p.add_tile(xyz.Stadia.StamenTonerLite, retina=True)
+        p = map_figure(ui_view, self.viewport)
+        p.on_event(RangesUpdate, self.ranges_update)
 
         p1 = p.scatter(
             x="longitude",
             y="latitude",
-            size=15,
+            size="size",
             fill_color="#0072b5",
             line_color="#0072b5",
             fill_alpha=0.8,
-            source=src_nodes,
+            source=self.src_nodes,
         )
         p.add_tools(
             HoverTool(
@@ -181,7 +449,7 @@ class MapPlot:
             )
         )
         p.add_tools(TapTool(renderers=[p1]))
-        src_nodes.selected.on_change("indices", self.nodes_indices_change)
+        self.src_nodes.selected.on_change("indices", self.nodes_indices_change)
 
         p2 = p.multi_line(
             xs="xs",
@@ -191,7 +459,7 @@ class MapPlot:
             line_alpha=0.8,
             hover_line_color="color",
             hover_line_alpha=0.5,
-            source=src_links,
+            source=self.src_links,
         )
         p.add_tools(
             HoverTool(
@@ -203,3 +471,301 @@ class MapPlot:
         )
 
         return p
+
+
+def get_frame_matrix(
+    data: pd.DataFrame,
+    variable: str,
+    dim: str,
+    members: pd.Index,
+    timesteps: np.ndarray,
+) -> np.ndarray:
+    """
+    Returns the values of `variable` in the long-format `data` summed per
+    timestep and member of `dim`, as a float32 matrix with one row per timestep
+    in `timesteps` and one column per member in `members`. Missing values and
+    other members are left out of the sums.
+
+    """
+    rows = np.searchsorted(timesteps, data.timesteps.to_numpy())
+    cols = members.get_indexer(data[dim])
+    valid = cols >= 0
+    matrix = np.bincount(
+        rows[valid] * len(members) + cols[valid],
+        weights=np.nan_to_num(data[variable].to_numpy(dtype=float)[valid]),
+        minlength=len(timesteps) * len(members),
+    )
+    return matrix.reshape(len(timesteps), len(members)).astype(np.float32)
+
+
+def _scale(values: np.ndarray, low: float, high: float) -> np.ndarray:
+    # Scales magnitudes to low..high, relative to the largest across all frames
+    magnitudes = np.abs(values)
+    largest = magnitudes.max(initial=0)
+    if largest == 0:
+        return np.full_like(values, low)
+    return (low + (high - low) * magnitudes / largest).astype(np.float32)
+
+
+# Applies the current frame to the node and link sources, with the blocks of
+# frames received so far kept on the block source. The sources are updated in
+# place, so that no data is sent back to the server
+APPLY_FRAME_JS = """
+const frames = (source_blocks.frames ??= new Map());
+const blocks = source_blocks.data;
+for (let i = 0; i < blocks.start.length; i++) {
+  if (!frames.has(blocks.start[i])) {
+    frames.set(blocks.start[i], {
+      node_size: blocks.node_size[i],
+      node_value: blocks.node_value[i],
+      link_width: blocks.link_width[i],
+      link_value: blocks.link_value[i],
+    });
+  }
+}
+const frame = slider.value;
+label.text = new Date(times[frame]).toISOString().slice(0, 16).replace("T", " ");
+const block = frames.get(frame - (frame % block_frames));
+if (block === undefined) return;  // Applied once the block is received
+const offset = frame % block_frames;
+function apply(source, columns) {
+  const n = source.get_length() ?? 0;
+  for (const [column, values] of Object.entries(columns)) {
+    const target = source.data[column];
+    for (let j = 0; j < n; j++) target[j] = values[offset * n + j];
+  }
+  source.change.emit();
+}
+apply(source_nodes, {size: block.node_size, value: block.node_value});
+apply(source_links, {width: block.link_width, value: block.link_value});
+"""
+
+# Advances the slider every `frame_ms` while playing, looping at the end, and
+# waits for the next block of frames if it has not been received yet
+PLAY_JS = """
+if (!toggle.active) {
+  clearInterval(toggle.timer);
+  toggle.label = "Play";
+  return;
+}
+toggle.label = "Pause";
+toggle.timer = setInterval(() => {
+  const next = slider.value < slider.end ? slider.value + 1 : slider.start;
+  const frames = source_blocks.frames;
+  if (frames !== undefined && frames.has(next - (next % block_frames))) {
+    slider.value = next;
+  }
+}, frame_ms);
+"""
+
+
+class MapAnimation:
+    """
+    Map of nodes and transmission links played back over time, with node sizes
+    scaled by the values of a timestep variable at each node (summed over
+    non-transmission techs and carriers) and link widths by the values of a
+    timestep variable of each link (summed over nodes and carriers).
+
+    As a link is a transmission tech at both of its end nodes, summing over
+    nodes adds up its values at both ends, e.g. for `flow_out`, the flows out
+    of the link in both directions, so that widths show how much flows along
+    a link but not in which direction. Only variables with values for
+    transmission techs (`variables_timesteps_links`) are offered for links.
+
+    The sizes and widths of all frames, i.e. the timesteps at the chosen
+    resolution, are computed once as float32 arrays, and sent to the browser
+    in blocks of `BLOCK_FRAMES` frames, the block being played and the next
+    one, as playback reaches them. Every frame is applied in the browser by
+    updating the sizes and widths of the plotted nodes and links in place,
+    so that playback is not held up by the server. Sizes and widths are
+    relative to the largest value over all frames. Nodes are not clustered,
+    unlike in `MapPlot`.
+
+    Args:
+        ui_view (UIView)
+
+    """
+
+    BLOCK_FRAMES = 168
+    FRAME_MS = 100
+    NODE_SIZE = (5, 40)
+    LINK_WIDTH = (1, 12)
+
+    def __init__(self, ui_view):
+        self.ui_view = ui_view
+        self.bounds = get_geo_bounds(ui_view.model_container, as_mercator=True)
+        self.viewport = (
+            *self.bounds.loc["longitude", :].to_list(),
+            *self.bounds.loc["latitude", :].to_list(),
+        )
+        self.sent = set()
+
+    @timed("MapAnimation.frames")
+    def frames(self, node_variable, link_variable, time_res, **selectors):
+        """
+        Computes the values, sizes and widths of the nodes and links in the
+        selection for every frame.
+
+        """
+        model_container = self.ui_view.model_container
+        base_tech = model_container.base_tech
+        techs = self.ui_view.coord_selectors["techs"].value
+        selection = model_container.get_selection(selectors)
+
+        self.df_nodes = get_nodes_geo(
+            model_container, as_mercator=True, selection=selection
+        )
+        self.df_links = get_line_xs_ys(
+            model_container, as_mercator=True, selection=selection
+        )
+        self.df_links["color"] = (
+            model_container.combined_data.color.to_series().reindex(self.df_links.index)
+        )
+
+        node_data = data_timeseries(
+            model_container,
+            node_variable,
+            time_res,
+            sum_by="techs",
+            **{
+                **selectors,
+                "techs": [i for i in techs if base_tech.get(i) != "transmission"],
+            },
+        )
+        link_data = data_timeseries(
+            model_container,
+            link_variable,
+            time_res,
+            sum_by="nodes",
+            **{**selectors, "techs": list(self.df_links.index)},
+        )
+        self.timesteps = np.union1d(
+            node_data.timesteps.to_numpy(), link_data.timesteps.to_numpy()
+        )
+
+        self.node_values = get_frame_matrix(
+            node_data, node_variable, "nodes", self.df_nodes.index, self.timesteps
+        )
+        self.link_values = get_frame_matrix(
+            link_data, link_variable, "techs", self.df_links.index, self.timesteps
+        )
+        self.node_sizes = _scale(self.node_values, *self.NODE_SIZE)
+        self.link_widths = _scale(self.link_values, *self.LINK_WIDTH)
+
+    def _block_data(self, blocks):
+        def block(matrix, start):
+            return matrix[start : start + self.BLOCK_FRAMES].ravel()
+
+        starts = [i * self.BLOCK_FRAMES for i in blocks]
+        return dict(
+            start=starts,
+            node_size=[block(self.node_sizes, i) for i in starts],
+            node_value=[block(self.node_values, i) for i in starts],
+            link_width=[block(self.link_widths, i) for i in starts],
+            link_value=[block(self.link_values, i) for i in starts],
+        )
+
+    def _blocks_needed(self, frame):
+        # The block of `frame` and the next one, wrapping around for looping
+        n_blocks = -(-len(self.timesteps) // self.BLOCK_FRAMES)
+        current = frame // self.BLOCK_FRAMES
+        return list(dict.fromkeys([current, (current + 1) % n_blocks]))
+
+    def frame_changed(self, attr, old, new):
+        blocks = [i for i in self._blocks_needed(new) if i not in self.sent]
+        if blocks:
+            self.sent.update(blocks)
+            self.src_blocks.data = self._block_data(blocks)
+
+    @timed("MapAnimation.plot")
+    def plot(self, node_variable, link_variable, time_res, **selectors):
+        self.frames(node_variable, link_variable, time_res, **selectors)
+        if len(self.timesteps) == 0:
+            return pn.pane.Markdown("No data for the current selection.")
+
+        blocks = self._blocks_needed(0)
+        self.sent = set(blocks)
+        self.src_blocks = ColumnDataSource(self._block_data(blocks))
+        self.src_nodes = ColumnDataSource(
+            dict(
+                longitude=self.df_nodes.longitude.to_numpy(),
+                latitude=self.df_nodes.latitude.to_numpy(),
+                name=self.df_nodes.index.to_list(),
+                size=self.node_sizes[0].copy(),
+                value=self.node_values[0].copy(),
+            )
+        )
+        self.src_links = ColumnDataSource(
+            dict(
+                xs=self.df_links["xs"].to_list(),
+                ys=self.df_links.ys.to_list(),
+                name=self.df_links.index.to_list(),
+                color=self.df_links.color.to_list(),
+                width=self.link_widths[0].copy(),
+                value=self.link_values[0].copy(),
+            )
+        )
+
+        p = map_figure(self.ui_view, self.viewport, sizing_mode="stretch_both")
+        nodes = p.scatter(
+            x="longitude",
+            y="latitude",
+            size="size",
+            fill_color="#0072b5",
+            line_color="#0072b5",
+            fill_alpha=0.8,
+            source=self.src_nodes,
+        )
+        links = p.multi_line(
+            xs="xs",
+            ys="ys",
+            line_width="width",
+            line_color="color",
+            line_alpha=0.8,
+            source=self.src_links,
+        )
+        p.add_tools(
+            HoverTool(
+                renderers=[nodes],
+                tooltips=[("node", "@name"), (node_variable, "@value")],
+            ),
+            HoverTool(
+                renderers=[links],
+                tooltips=[("link", "@name"), (link_variable, "@value")],
+            ),
+        )
+
+        self.slider = Slider(
+            start=0,
+            end=max(len(self.timesteps) - 1, 1),
+            value=0,
+            step=1,
+            title="Frame",
+            sizing_mode="stretch_width",
+            disabled=len(self.timesteps) < 2,
+        )
+        label = Div(width=140)
+        toggle = Toggle(label="Play", width=80, disabled=len(self.timesteps) < 2)
+        args = dict(
+            source_blocks=self.src_blocks,
+            source_nodes=self.src_nodes,
+            source_links=self.src_links,
+            slider=self.slider,
+            label=label,
+            toggle=toggle,
+            times=self.timesteps.astype("datetime64[ms]").astype(np.int64).tolist(),
+            block_frames=self.BLOCK_FRAMES,
+            frame_ms=self.FRAME_MS,
+        )
+        apply_frame = CustomJS(args=args, code=APPLY_FRAME_JS)
+        self.slider.js_on_change("value", apply_frame)
+        self.src_blocks.js_on_change("data", apply_frame)
+        toggle.js_on_change("active", CustomJS(args=args, code=PLAY_JS))
+        self.slider.on_change("value", self.frame_changed)
+        label.text = str(pd.Timestamp(self.timesteps[0]))[:16]
+
+        return column(
+            p,
+            row(toggle, self.slider, label, sizing_mode="stretch_width"),
+            sizing_mode="stretch_both",
+        )
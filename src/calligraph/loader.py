@@ -0,0 +1,98 @@
+import logging
+import threading
+from pathlib import Path
+
+from calligraph.core import ModelContainer
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ModelLoader:
+    """
+    Loads a `ModelContainer` in a background thread, so that the app can be
+    served while the model loads.
+
+    The model is loaded in two stages: first the inputs, which include
+    everything the UI itself and its Home page depend on, after which
+    `model_container` is set; then the results, one variable at a time, after
+    which `done` is set. Results that are needed before they have been loaded
+    in the background are loaded on demand as usual.
+
+    `progress` (from 0 to 100, or -1 while unknown) and `message` describe the
+    current stage, e.g. for a progress bar. If loading fails, `error` is set.
+
+    Args:
+        path (str | Path): Path to a Calliope NetCDF file.
+        track_changes (bool): Record checksums of the model file once loaded,
+            as needed to watch it for changes.
+        **kwargs: Passed to `ModelContainer`.
+
+    """
+
+    def __init__(self, path: str | Path, track_changes: bool = False, **kwargs):
+        self.path = Path(path)
+        self.track_changes = track_changes
+        self.kwargs = kwargs
+        self.model_container = None
+        self.done = False
+        self.error = None
+        self.progress = -1
+        self.message = f"Reading model inputs from {self.path.name}"
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name=f"calligraph.loader:{self.path}", daemon=True
+        )
+
+    def start(self) -> "ModelLoader":
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Waits until loading has finished or failed, and returns whether it
+        has finished.
+
+        """
+        self._thread.join(timeout)
+        return self.done
+
+    def add_done_callback(self, callback) -> None:
+        """
+        Calls `callback` with the model container once loading has finished,
+        from the loading thread, or right away if it has already finished.
+
+        """
+        with self._lock:
+            if not self.done:
+                self._callbacks.append(callback)
+                return
+        callback(self.model_container)
+
+    def _progress(self, variable, i, n):
+        self.progress = round(100 * i / n)
+        self.message = f"Loading results: {variable} ({i + 1} of {n})"
+
+    def _run(self):
+        try:
+            model_container = ModelContainer(
+                self.path, defer_results=True, **self.kwargs
+            )
+            self.progress = 0
+            self.model_container = model_container
+            model_container.load_unloaded(progress=self._progress)
+            if self.track_changes:
+                self.progress = -1
+                self.message = "Computing checksums of the model file"
+                model_container.track_changes()
+        except Exception as e:
+            LOGGER.exception(f"Loading {self.path} failed")
+            self.error = e
+            return
+        self.progress = 100
+        self.message = "Loaded"
+        with self._lock:
+            self.done = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(model_container)
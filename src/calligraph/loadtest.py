@@ -0,0 +1,239 @@
+import concurrent.futures
+import logging
+import random
+import socket
+import threading
+import time
+
+import pandas as pd
+import panel as pn
+from bokeh.client import pull_session
+from bokeh.models import TapTool
+
+from calligraph.core import ModelContainer, get_process_rss
+from calligraph.ui import UIView
+
+LOGGER = logging.getLogger(__name__)
+
+
+def interaction_switch_page(ui_view, rng):
+    ui_view.switch_page(rng.choice(list(ui_view.pages)))
+
+
+def interaction_filter(ui_view, rng):
+    coord = rng.choice(["nodes", "carriers", "techs_supply"])
+    selector = ui_view.coord_selectors[coord]
+    k = rng.randint(1, len(selector.options)) if selector.options else 0
+    selector.value = rng.sample(list(selector.options), k)
+
+
+def _select_on_page(ui_view, page, type):
+    # Returns the objects of the given type on `page`, switching to it if needed
+    if getattr(ui_view, "current_page", None) != page:
+        ui_view.switch_page(page)
+    return ui_view.view.main[0].select(type)
+
+
+def interaction_resolution(ui_view, rng):
+    # Changes the time resolution on the timeseries page
+    for widget in _select_on_page(
+        ui_view, "Timeseries plots", pn.widgets.RadioButtonGroup
+    ):
+        if "Original resolution" in widget.options:
+            widget.value = rng.choice([i for i in widget.options if i != widget.value])
+
+
+def interaction_map_tap(ui_view, rng):
+    # Selects a random node on the map, as a tap in the browser would
+    for pane in _select_on_page(ui_view, "Map plots", pn.pane.Bokeh):
+        for tap_tool in pane.object.select({"type": TapTool}):
+            for renderer in tap_tool.renderers:
+                n = len(next(iter(renderer.data_source.data.values()), []))
+                if n > 0:
+                    renderer.data_source.selected.indices = [rng.randrange(n)]
+
+
+INTERACTIONS = {
+    "switch_page": interaction_switch_page,
+    "filter": interaction_filter,
+    "resolution": interaction_resolution,
+    "map_tap": interaction_map_tap,
+}
+
+
+class LoadTest:
+    """
+    Serves calligraph locally and drives simulated sessions against it.
+
+    Each simulated session connects to the server with the Bokeh client, so
+    the server creates, serialises and synchronises a real session document
+    as it would for a browser. Interactions are then scheduled on that
+    session's document, so that they run on the server's event loop like
+    callbacks triggered from a browser, and their latency includes any time
+    spent waiting behind other sessions.
+
+    Args:
+        model_container (ModelContainer): The model to serve.
+        sessions (int): Number of concurrent simulated sessions.
+        interactions (int): Number of interactions per session.
+        think_time (float): Mean pause between interactions of a session, in
+            seconds.
+        seed (int): Seed for choosing interactions.
+
+    """
+
+    def __init__(
+        self,
+        model_container: ModelContainer,
+        sessions: int = 10,
+        interactions: int = 20,
+        think_time: float = 1.0,
+        seed: int = 0,
+    ):
+        self.model_container = model_container
+        self.sessions = sessions
+        self.interactions = interactions
+        self.think_time = think_time
+        self.seed = seed
+        self.records = []
+        self.memory = []
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def _app(self):
+        key = pn.state.session_args.get("loadtest_session", [b""])[0].decode()
+        ui_view = UIView(self.model_container)
+        self._views[key] = (ui_view, pn.state.curdoc)
+        return ui_view.view
+
+    def _record(self, session, interaction, start, end, error=False):
+        with self._lock:
+            self.records.append(
+                dict(
+                    session=session,
+                    interaction=interaction,
+                    start=start,
+                    latency=end - start,
+                    error=error,
+                )
+            )
+
+    def _run_in_session(self, key, func, *args):
+        ui_view, doc = self._views[key]
+        future = concurrent.futures.Future()
+
+        def callback():
+            try:
+                future.set_result(func(ui_view, *args))
+            except Exception as e:
+                future.set_exception(e)
+
+        doc.add_next_tick_callback(callback)
+        return future.result()
+
+    def _session(self, url, index):
+        rng = random.Random(self.seed + index)
+        key = str(index)
+
+        start = time.perf_counter()
+        session = pull_session(url=url, arguments={"loadtest_session": key})
+        self._record(index, "open_session", start, time.perf_counter())
+        try:
+            for _ in range(self.interactions):
+                time.sleep(rng.expovariate(1 / self.think_time))
+                name = rng.choice(list(INTERACTIONS))
+                start = time.perf_counter()
+                try:
+                    self._run_in_session(key, INTERACTIONS[name], rng)
+                except Exception:
+                    LOGGER.exception(f"Interaction {name} failed in session {key}")
+                    self._record(index, name, start, time.perf_counter(), error=True)
+                else:
+                    self._record(index, name, start, time.perf_counter())
+        finally:
+            session.close()
+
+    def _monitor_memory(self, stop):
+        while not stop.is_set():
+            self.memory.append((time.perf_counter(), get_process_rss()))
+            stop.wait(0.5)
+
+    def run(self, port: int = 0) -> None:
+        if port == 0:
+            with socket.socket() as s:
+                s.bind(("localhost", 0))
+                port = s.getsockname()[1]
+        server = pn.serve(
+            self._app,
+            port=port,
+            show=False,
+            threaded=True,
+            # Sessions are kept alive by the Bokeh clients
+            unused_session_lifetime_milliseconds=3600 * 1000,
+        )
+        stop_monitor = threading.Event()
+        monitor = threading.Thread(target=self._monitor_memory, args=(stop_monitor,))
+        monitor.start()
+        try:
+            url = f"http://localhost:{port}/"
+            self._wait_for_server(port)
+            self._started = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor(self.sessions) as executor:
+                futures = [
+                    executor.submit(self._session, url, i) for i in range(self.sessions)
+                ]
+                for future in futures:
+                    future.result()
+            self._finished = time.perf_counter()
+        finally:
+            stop_monitor.set()
+            monitor.join()
+            server.stop()
+
+    @staticmethod
+    def _wait_for_server(port, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("localhost", port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise TimeoutError(f"Server did not start on port {port}")
+
+    def latency_summary(self) -> pd.DataFrame:
+        """
+        Returns count, errors and latency percentiles (in seconds) per
+        interaction.
+
+        """
+        df = pd.DataFrame(self.records)
+        grouped = df.groupby("interaction")["latency"]
+        return pd.DataFrame(
+            {
+                "count": grouped.count(),
+                "errors": df.groupby("interaction")["error"].sum(),
+                "p50": grouped.quantile(0.5),
+                "p90": grouped.quantile(0.9),
+                "p99": grouped.quantile(0.99),
+                "max": grouped.max(),
+            }
+        )
+
+    def summary(self) -> dict:
+        """
+        Returns overall throughput and server memory figures.
+
+        """
+        duration = self._finished - self._started
+        interactions = [i for i in self.records if i["interaction"] != "open_session"]
+        rss = [i[1] for i in self.memory if i[1] is not None]
+        return dict(
+            sessions=self.sessions,
+            duration_s=duration,
+            interactions=len(interactions),
+            errors=sum(i["error"] for i in interactions),
+            throughput_per_s=len(interactions) / duration,
+            rss_start_mib=rss[0] / 2**20 if rss else None,
+            rss_peak_mib=max(rss) / 2**20 if rss else None,
+        )
@@ -2,6 +2,7 @@ import panel as pn
 
 import calligraph.core as core
 import calligraph.geo
+import calligraph.perf
 import calligraph.plot
 
 
@@ -20,7 +21,37 @@ def page_home(ui_view):
                 # ),
             ),
             pn.Column(pn.Param(model_container.colors_techs, name="Tech colors")),
-        )
+        ),
+        memory_card(model_container),
+    )
+
+
+def memory_card(model_container):
+    def get_memory_df():
+        df = model_container.memory_usage()
+        rss = core.get_process_rss()
+        df.loc[len(df)] = ("process", "RSS", rss if rss is not None else float("nan"))
+        df["MiB"] = (df.pop("bytes") / 2**20).round(2)
+        return df.set_index(["kind", "name"])
+
+    memory_df = pn.pane.DataFrame(get_memory_df(), sizing_mode="stretch_width")
+
+    def refresh():
+        memory_df.object = get_memory_df()
+
+    def unload_idle():
+        model_container.unload_idle(idle_seconds=300)
+        refresh()
+
+    btn_refresh = pn.widgets.Button(icon="refresh", name="Refresh")
+    btn_refresh.on_click(lambda event: refresh())
+    btn_unload = pn.widgets.Button(
+        icon="trash", name="Unload variables unused for 5 minutes"
+    )
+    btn_unload.on_click(lambda event: unload_idle())
+
+    return pn.Card(
+        pn.Row(btn_refresh, btn_unload), memory_df, title="Memory usage", collapsed=True
     )
 
 
@@ -96,10 +127,55 @@ def page_map(ui_view):
 
     map_side_plots = pn.Column(plot_timeseries_pane, plot_static_pane)
 
-    return [
-        pn.Column(widget_variable_map_nodes, widget_variable_map_links, plot_map_pane),
-        pn.Column(map_side_plots),
-    ]
+    # Only the active tab is rendered
+    map_tabs = pn.Tabs(
+        (
+            "Map",
+            pn.Column(
+                widget_variable_map_nodes, widget_variable_map_links, plot_map_pane
+            ),
+        ),
+        ("Animation", page_map_animation(ui_view)),
+        dynamic=True,
+        sizing_mode="stretch_both",
+    )
+
+    return [map_tabs, pn.Column(map_side_plots)]
+
+
+def page_map_animation(ui_view):
+    widget_variable_animation_nodes = ui_view.initialise_resettable_widget(
+        id="variable_animation_nodes",
+        name="Variable (nodes)",
+        value="flow_out",
+        variables="variables_timesteps_nodes",
+    )
+    widget_variable_animation_links = ui_view.initialise_resettable_widget(
+        id="variable_animation_links",
+        name="Variable (links)",
+        value="flow_out",
+        variables="variables_timesteps_links",
+    )
+    btn_time_res = pn.widgets.RadioButtonGroup(
+        options=["Monthly", "Weekly", "Daily", "Original resolution"], value="Daily"
+    )
+
+    map_animation = calligraph.geo.MapAnimation(ui_view)
+
+    plot_animation_pane = pn.bind(
+        map_animation.plot,
+        node_variable=widget_variable_animation_nodes,
+        link_variable=widget_variable_animation_links,
+        time_res=btn_time_res,
+        **{i: ui_view.coord_selectors[i] for i in ui_view.filter_coords},
+    )
+
+    # Frames are only computed once the tab is shown
+    return pn.Column(
+        pn.Row(widget_variable_animation_nodes, widget_variable_animation_links),
+        pn.Row("Time resolution:", btn_time_res),
+        pn.panel(plot_animation_pane, lazy=True),
+    )
 
 
 def page_table(ui_view):
@@ -123,3 +199,31 @@ def page_table(ui_view):
         pn.Row(widget_variable_export, "Drop N/A values?", switch_dropna),
         pn.pane.Perspective(df, sizing_mode="stretch_both"),
     )
+
+
+def page_performance(ui_view):
+    recorder = calligraph.perf.RECORDER
+
+    summary = pn.pane.DataFrame(recorder.summary(), sizing_mode="stretch_width")
+    slowest = pn.pane.DataFrame(recorder.slowest(), sizing_mode="stretch_width")
+
+    def refresh():
+        summary.object = recorder.summary()
+        slowest.object = recorder.slowest()
+
+    def clear():
+        recorder.clear()
+        refresh()
+
+    btn_refresh = pn.widgets.Button(icon="refresh", name="Refresh")
+    btn_refresh.on_click(lambda event: refresh())
+    btn_clear = pn.widgets.Button(icon="trash", name="Clear")
+    btn_clear.on_click(lambda event: clear())
+
+    return pn.Column(
+        pn.Row(btn_refresh, btn_clear),
+        "## Timings per stage (seconds)",
+        summary,
+        "## Slowest requests",
+        slowest,
+    )
@@ -0,0 +1,148 @@
+import functools
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+
+# Setting this environment variable to anything but "", "0" or "false"
+# enables timing instrumentation, as does the `--profile` CLI option
+ENV_VAR = "CALLIGRAPH_PROFILE"
+
+
+class TimingRecorder:
+    """
+    Records the duration of instrumented stages in a bounded buffer and
+    emits each timing as a structured (JSON) log message.
+
+    Stages that run inside another instrumented stage are recorded with the
+    same request id as the outermost stage, which is taken to be the callback
+    that triggered them.
+
+    Args:
+        maxlen (int): Maximum number of timings kept in memory.
+
+    """
+
+    def __init__(self, maxlen: int = 10000):
+        self.enabled = os.environ.get(ENV_VAR, "").lower() not in ("", "0", "false")
+        self.records = deque(maxlen=maxlen)
+        self._local = threading.local()
+        self._request_ids = itertools.count()
+
+    def enable(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+
+    def clear(self) -> None:
+        self.records.clear()
+
+    @contextmanager
+    def timer(self, stage: str, **context):
+        """
+        Context manager recording the duration of the enclosed block as `stage`.
+        Any keyword arguments are stored with the timing.
+
+        """
+        if not self.enabled:
+            yield
+            return
+
+        stack = self._local.__dict__.setdefault("stack", [])
+        record = dict(
+            stage=stage,
+            request=stack[-1]["request"] if stack else next(self._request_ids),
+            parent=stack[-1]["stage"] if stack else None,
+            thread=threading.current_thread().name,
+            start=time.time(),
+            **context,
+        )
+        stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record["duration"] = time.perf_counter() - start
+            stack.pop()
+            self.records.append(record)
+            LOGGER.info(json.dumps(record, default=str))
+
+    def timed(self, stage: str | None = None):
+        """
+        Decorator recording the duration of each call to the decorated function,
+        using the function's name as the stage name unless `stage` is given.
+
+        """
+
+        def decorator(func):
+            name = stage if stage is not None else func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.timer(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def to_dataframe(self) -> pd.DataFrame:
+        columns = ["stage", "request", "parent", "thread", "start", "duration"]
+        return pd.DataFrame(list(self.records), columns=columns)
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Returns call counts and duration percentiles (in seconds) per stage.
+
+        """
+        df = self.to_dataframe()
+        if df.empty:
+            return pd.DataFrame(columns=["count", "p50", "p90", "p99", "max"])
+        grouped = df.groupby("stage")["duration"]
+        summary = pd.DataFrame(
+            {
+                "count": grouped.count(),
+                "p50": grouped.quantile(0.5),
+                "p90": grouped.quantile(0.9),
+                "p99": grouped.quantile(0.99),
+                "max": grouped.max(),
+            }
+        )
+        return summary.sort_values("p90", ascending=False)
+
+    def slowest(self, n: int = 20) -> pd.DataFrame:
+        """
+        Returns the `n` slowest requests, i.e. outermost stages, together with
+        a breakdown of the time spent in the stages they called.
+
+        """
+        df = self.to_dataframe()
+        if df.empty:
+            return pd.DataFrame(columns=["stage", "start", "duration", "breakdown"])
+        requests = df[df.parent.isna()].nlargest(n, "duration")
+        nested = df[df.parent.notna() & df.request.isin(requests.request)]
+        breakdown = (
+            (nested.stage + " " + nested.duration.map("{:.3f}s".format))
+            .groupby(nested.request)
+            .agg("; ".join)
+        )
+        requests = requests.assign(
+            start=pd.to_datetime(requests.start, unit="s"),
+            breakdown=requests.request.map(breakdown).fillna(""),
+        )
+        return requests.set_index("request")[
+            ["stage", "start", "duration", "breakdown"]
+        ]
+
+
+RECORDER = TimingRecorder()
+timer = RECORDER.timer
+timed = RECORDER.timed
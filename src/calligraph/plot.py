@@ -1,14 +1,181 @@
+import functools
+
+import numpy as np
 import pandas as pd
 import panel as pn
-import plotly.express as px
-
-from calligraph.core import get_df_static, get_df_timeseries
-
-
+import plotly.graph_objects as go
+import plotly.io as pio
+from bokeh.events import RangesUpdate
+from bokeh.models import (
+    ColumnDataSource,
+    CustomJSHover,
+    FixedTicker,
+    HoverTool,
+    LinearColorMapper,
+)
+from bokeh.palettes import RdBu11, Viridis256
+from bokeh.plotting import figure
+
+from calligraph.core import (
+    get_df_static,
+    get_df_timeseries,
+    get_executor,
+    source_variables,
+    timeseries_query,
+)
+from calligraph.perf import timed
+
+
+@functools.cache
+def _template(name: str) -> dict:
+    return pio.templates[name].to_plotly_json()
+
+
+def lean_figure(
+    data: pd.DataFrame,
+    x: str,
+    y: str,
+    kind: str = "bar",
+    color: str | None = None,
+    color_discrete_map: dict | None = None,
+    facet_col: str | None = None,
+) -> go.Figure:
+    """
+    Returns the figure that `px.bar` (`kind="bar"`) or `px.line` with
+    `render_mode="webgl"` (`kind="line"`) would return for the same arguments.
+
+    Traces are built directly from the NumPy arrays of every group of rows,
+    without copying `data` per trace, and the figure is not validated.
+    Datetimes are passed as epoch milliseconds on a date axis, so that
+    all data arrays are sent to the browser in binary.
+
+    """
+    template = _template(pio.templates.default)
+    colorway = template["layout"]["colorway"]
+    color_discrete_map = dict(color_discrete_map or {})
+
+    # Groups in order of first appearance, by color and then by facet, as in
+    # plotly express
+    color_codes, colors = (
+        pd.factorize(data[color]) if color else (np.zeros(len(data), int), [None])
+    )
+    facet_codes, facets = (
+        pd.factorize(data[facet_col])
+        if facet_col
+        else (np.zeros(len(data), int), [None])
+    )
+    keys = color_codes * len(facets) + facet_codes
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    if len(data) == 0:
+        # Plotly express shows a single pair of axes, with one empty trace
+        # only if nothing is grouped
+        groups = np.zeros(0 if color or facet_col else 1, dtype=int)
+        starts = ends = groups
+        facets, facet_col = [None], None
+    else:
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)]
+        groups = keys[starts]
+
+    xs = data[x].to_numpy()
+    is_date = np.issubdtype(xs.dtype, np.datetime64)
+    if is_date:
+        xs = xs.astype("datetime64[ms]").astype(np.int64).astype(float)
+    xs = xs[order]
+    ys = data[y].to_numpy()[order]
+
+    traces = []
+    in_legend = set()
+    for group, start, end in zip(groups, starts, ends):
+        color_value = colors[group // len(facets)]
+        facet = group % len(facets)
+        if color_value is not None and str(color_value) not in color_discrete_map:
+            color_discrete_map[str(color_value)] = colorway[
+                len(color_discrete_map) % len(colorway)
+            ]
+        name = "" if color_value is None else str(color_value)
+        hover = [f"{color}={name}"] if color else []
+        if facet_col:
+            hover.append(f"{facet_col}={facets[facet]}")
+        hover += [f"{x}=%{{x}}", f"{y}=%{{y}}"]
+        trace = dict(
+            hovertemplate="<br>".join(hover) + "<extra></extra>",
+            legendgroup=name,
+            name=name,
+            showlegend=color is not None and name not in in_legend,
+            x=xs[start:end],
+            xaxis="x" if facet == 0 else f"x{facet + 1}",
+            y=ys[start:end],
+            yaxis="y" if facet == 0 else f"y{facet + 1}",
+        )
+        in_legend.add(name)
+        trace_color = color_discrete_map.get(name, colorway[0])
+        if kind == "bar":
+            trace.update(
+                marker=dict(color=trace_color, pattern=dict(shape="")),
+                orientation="v",
+                textposition="auto",
+                type="bar",
+            )
+        else:
+            trace.update(
+                line=dict(color=trace_color, dash="solid"),
+                marker=dict(symbol="circle"),
+                mode="lines",
+                type="scattergl",
+            )
+        traces.append(trace)
+
+    # Facets side by side, as laid out by plotly express
+    layout = dict(template=template, margin=dict(t=60), legend=dict(tracegroupgap=0))
+    spacing = 0.02
+    width = (1 - spacing * (len(facets) - 1)) * (1 / len(facets))
+    annotations = []
+    for i, facet in enumerate(facets):
+        suffix = "" if i == 0 else str(i + 1)
+        start = sum([width] * i) + i * spacing
+        domain = [start, start + width]
+        xaxis = dict(anchor="y" + suffix, domain=domain, title=dict(text=x))
+        yaxis = dict(anchor="x" + suffix, domain=[0.0, 1.0])
+        if is_date:
+            xaxis["type"] = "date"
+        if i == 0:
+            yaxis["title"] = dict(text=y)
+        else:
+            xaxis["matches"] = "x"
+            yaxis.update(matches="y", showticklabels=False)
+        layout["xaxis" + suffix] = xaxis
+        layout["yaxis" + suffix] = yaxis
+        if facet_col:
+            annotations.append(
+                dict(
+                    font={},
+                    showarrow=False,
+                    text=f"{facet_col}={facet}",
+                    x=sum(domain) / 2,
+                    xanchor="center",
+                    xref="paper",
+                    y=1.0,
+                    yanchor="bottom",
+                    yref="paper",
+                )
+            )
+    if annotations:
+        layout["annotations"] = annotations
+    if color and traces:
+        layout["legend"]["title"] = dict(text=color)
+    if kind == "bar":
+        layout["barmode"] = "relative"
+
+    return go.Figure(data=traces, layout=layout, _validate=False)
+
+
+@timed()
 def fig_static(model_container, variable, **selectors):
     data = get_df_static(model_container, variable, selectors)
 
-    fig = px.bar(
+    fig = lean_figure(
         data,
         x=(
             "nodes"
@@ -23,12 +190,14 @@ def fig_static(model_container, variable, **selectors):
     return fig
 
 
+RESOLUTIONS = {"Monthly": "1ME", "Weekly": "7D", "Daily": "1D"}
+
+
+@timed()
 def data_timeseries(
     model_container, variable, time_res, time_range=None, sum_by="nodes", **selectors
 ):
 
-    RESOLUTIONS = {"Monthly": "1ME", "Weekly": "7D", "Daily": "1D"}
-
     data = get_df_timeseries(
         model_container,
         variable,
@@ -41,8 +210,27 @@ def data_timeseries(
     return data
 
 
+def query_timeseries(
+    model_container, variable, time_res, time_range=None, sum_by="nodes", **selectors
+):
+    """
+    Returns the normalised query of the data that `data_timeseries` returns
+    for the same arguments.
+
+    """
+    return timeseries_query(
+        model_container,
+        variable,
+        selectors,
+        time_subset=time_range,
+        resample=RESOLUTIONS.get(time_res, None),
+        sum_by=sum_by,
+    )
+
+
+@timed()
 def fig_object_timeseries_bar(model_container, variable, data):
-    return px.bar(
+    return lean_figure(
         data,
         x="timesteps",
         y=variable,
@@ -55,8 +243,9 @@ def fig_object_timeseries_bar(model_container, variable, data):
     )
 
 
+@timed()
 def fig_object_timeseries_line(model_container, variable, data):
-    return px.line(
+    return lean_figure(
         data,
         x="timesteps",
         y=variable,
@@ -66,32 +255,68 @@ def fig_object_timeseries_line(model_container, variable, data):
             else "nodes" if "nodes" in data.columns else None
         ),
         color_discrete_map=model_container.colors_techs.param.values(),
-        render_mode="webgl",
+        kind="line",
     )
 
 
-def fig_object_timeseries_duration(model_container, variable, data):
-
-    # Obtain list of columns without "timesteps" and the selected variable
-    non_ts_var_cols = list(set(data.columns) - set(["timesteps", variable]))
-
-    # A dict of all combinations of non_ts_var_col values that have some data
-    combinations = (
-        data.groupby(non_ts_var_cols).count().reset_index()[non_ts_var_cols].T.to_dict()
-    )
-
-    # We iterate over all combinations and query the `data` dataframe, then sort on only
-    # the values of variable in that subset, before combining all the resulting sub-dataframes
-    # back into a duration-sorted one
-    dfs = {}
-    for item in combinations.values():
-        query = " and ".join(["{} == '{}'".format(k, v) for k, v in item.items()])
-        ldc_data = data.query(query).sort_values(variable, ascending=False)
-        ldc_data["timestep number"] = range(len(ldc_data))
-        dfs[tuple(item.values())] = ldc_data
-    data_sorted = pd.concat(dfs, ignore_index=True)
-
-    return px.line(
+def sort_duration(data, variable, workers=1):
+    """
+    Returns `data` sorted in descending order of `variable` within every series,
+    with a "timestep number" column counting up within each series.
+
+    Series are identified by all columns other than "timesteps" and `variable`,
+    and ordered by those columns. With `workers` > 1, blocks of series are
+    sorted in parallel threads, with identical results.
+
+    """
+    series_cols = [i for i in data.columns if i not in ["timesteps", variable]]
+    if series_cols:
+        codes = data.groupby(series_cols, observed=True).ngroup().to_numpy()
+    else:
+        codes = np.zeros(len(data), dtype=np.int64)
+    # Negating sorts in descending order, with NaN still last
+    negated = -data[variable].to_numpy()
+
+    def sort_rows(rows):
+        return rows[np.lexsort((negated[rows], codes[rows]))]
+
+    # Rows with missing labels belong to no series and are dropped
+    rows = np.flatnonzero(codes >= 0)
+    sizes = np.bincount(codes[rows]) if len(rows) else np.zeros(0, dtype=np.int64)
+    n_blocks = min(workers, len(sizes))
+    if n_blocks > 1:
+        rows = rows[np.argsort(codes[rows], kind="stable")]
+        # Split at series boundaries into blocks of about equal numbers of rows
+        ends = np.cumsum(sizes)
+        bounds = ends[
+            np.searchsorted(ends, np.linspace(0, ends[-1], n_blocks + 1)[1:-1])
+        ]
+        blocks = np.split(rows, np.unique(bounds))
+        order = np.concatenate(list(get_executor(workers).map(sort_rows, blocks)))
+    else:
+        order = sort_rows(rows)
+
+    data_sorted = data.iloc[order].reset_index(drop=True)
+    starts = np.cumsum(sizes) - sizes
+    data_sorted["timestep number"] = np.arange(len(order)) - np.repeat(starts, sizes)
+    return data_sorted
+
+
+@timed()
+def fig_object_timeseries_duration(model_container, variable, data, query=None):
+    # Only data fetched as a whole by a known query is cached, by that query,
+    # rather than every time window or filter state of it
+    if query is None:
+        data_sorted = sort_duration(data, variable, model_container.workers)
+    else:
+        data_sorted = model_container.cached(
+            "sort_duration",
+            query,
+            lambda: sort_duration(data, variable, model_container.workers),
+            variables=source_variables(variable),
+        )
+
+    return lean_figure(
         data_sorted,
         x="timestep number",
         y=variable,
@@ -101,41 +326,349 @@ def fig_object_timeseries_duration(model_container, variable, data):
             else "nodes" if "nodes" in data.columns else None
         ),
         color_discrete_map=model_container.colors_techs.param.values(),
-        render_mode="webgl",
+        kind="line",
     )
 
 
+class HeatmapPlot:
+    """
+    Heatmap of a variable over time (x) and series (y), e.g. techs, rendered on
+    the server into an image of at most `RASTER_WIDTH` x `RASTER_HEIGHT` pixels.
+
+    Only the part of the data within the current view is rasterised, and it is
+    re-rasterised whenever the view changes, so that zooming in reveals the
+    full resolution. Where several timesteps or series fall into one pixel, it
+    shows their mean. The hover readout shows the same bin mean, alongside the
+    number of values it is the mean of, so it is only the actual value of a
+    single timestep and series once zoomed in far enough for it to be 1.
+
+    Args:
+        data (pd.DataFrame): Long-format data with a `timesteps` column, a
+            `variable` column and any number of columns identifying the series.
+        variable (str): The variable to plot.
+
+    """
+
+    RASTER_WIDTH = 1200
+    RASTER_HEIGHT = 600
+
+    def __init__(self, data: pd.DataFrame, variable: str):
+        self.variable = variable
+        series_cols = [i for i in data.columns if i not in ["timesteps", variable]]
+        if not series_cols:
+            data, series_cols = data.assign(series=variable), ["series"]
+        # Scatters the values into a series x timesteps matrix by their group
+        # codes, which is much faster than unstacking
+        grouped = data.groupby(series_cols, sort=True, dropna=False, observed=True)
+        rows = grouped.ngroup().to_numpy()
+        cols, timesteps = pd.factorize(data["timesteps"], sort=True)
+        series = grouped.size().index
+        dtype = np.float32 if data[variable].dtype == np.float32 else float
+        self.matrix = np.full((len(series), len(timesteps)), np.nan, dtype=dtype)
+        self.matrix[rows, cols] = data[variable].to_numpy(dtype=dtype)
+        self.labels = [
+            " / ".join(map(str, i)) if isinstance(i, tuple) else str(i) for i in series
+        ]
+        # Each timestep spans until the next one, the last one for the median step
+        times = pd.DatetimeIndex(timesteps).to_numpy(dtype="datetime64[ms]")
+        times = times.astype(np.int64)
+        step = np.median(np.diff(times)) if len(times) > 1 else 3600 * 1000
+        if len(times):
+            self.edges = np.append(times, times[-1] + step).astype(float)
+        else:
+            self.edges = np.array([0, step], dtype=float)
+
+        self.source = ColumnDataSource()
+        self.viewport = (self.edges[0], self.edges[-1], 0, max(len(self.labels), 1))
+
+    def _bins(self, start, end, pixels):
+        # Start positions of up to `pixels` bins covering positions start..end
+        bins = np.linspace(start, end, min(end - start, pixels) + 1)[:-1]
+        return np.unique(bins.astype(int))
+
+    @timed("HeatmapPlot.rasterize")
+    def rasterize(self):
+        x0, x1, y0, y1 = self.viewport
+        n_rows, n_cols = self.matrix.shape
+        col_start = max(np.searchsorted(self.edges, x0, side="right") - 1, 0)
+        col_end = min(np.searchsorted(self.edges, x1, side="left"), n_cols)
+        row_start = int(np.clip(np.floor(y0), 0, n_rows))
+        row_end = int(np.clip(np.ceil(y1), 0, n_rows))
+        if col_end <= col_start or row_end <= row_start:
+            self.source.data = dict(image=[], count=[], x=[], y=[], dw=[], dh=[])
+            return
+
+        cols = self._bins(col_start, col_end, self.RASTER_WIDTH)
+        rows = self._bins(row_start, row_end, self.RASTER_HEIGHT)
+        window = self.matrix[row_start:row_end, col_start:col_end]
+        valid = ~np.isnan(window)
+
+        def binned_sum(a):
+            a = np.add.reduceat(a, rows - row_start, axis=0)
+            return np.add.reduceat(a, cols - col_start, axis=1)
+
+        count = binned_sum(valid)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            image = binned_sum(np.where(valid, window, 0)) / count
+
+        self.source.data = dict(
+            image=[image],
+            count=[count],
+            x=[self.edges[col_start]],
+            y=[row_start],
+            dw=[self.edges[col_end] - self.edges[col_start]],
+            dh=[row_end - row_start],
+        )
+
+    def ranges_update(self, event):
+        self.viewport = (event.x0, event.x1, event.y0, event.y1)
+        self.rasterize()
+
+    def figure(self):
+        self.rasterize()
+
+        if np.isnan(self.matrix).all():
+            # Nothing to show, e.g. for an empty selection
+            low, high = 0, 1
+        else:
+            low, high = np.nanmin(self.matrix), np.nanmax(self.matrix)
+        if low < 0 < high:
+            # Diverging colours centred on zero, e.g. for net flows
+            limit = max(-low, high)
+            palette, low, high = RdBu11[::-1], -limit, limit
+        else:
+            palette = Viridis256
+        color_mapper = LinearColorMapper(
+            palette=palette, low=low, high=high, nan_color=(0, 0, 0, 0)
+        )
+
+        x0, x1, y0, y1 = self.viewport
+        p = figure(
+            x_range=(x0, x1),
+            y_range=(y0, y1),
+            x_axis_type="datetime",
+            sizing_mode="stretch_width",
+            height=max(300, min(20 * len(self.labels), 800)),
+            tools="xpan,xwheel_zoom,box_zoom,reset",
+            active_scroll="xwheel_zoom",
+        )
+        image = p.image(
+            image="image",
+            x="x",
+            y="y",
+            dw="dw",
+            dh="dh",
+            color_mapper=color_mapper,
+            source=self.source,
+        )
+        p.add_layout(image.construct_color_bar(title=self.variable), "right")
+
+        # Label every series at its centre if they are few enough to be legible
+        if len(self.labels) <= 50:
+            p.yaxis.ticker = FixedTicker(
+                ticks=[i + 0.5 for i in range(len(self.labels))]
+            )
+            p.yaxis.major_label_overrides = {
+                i + 0.5: label for i, label in enumerate(self.labels)
+            }
+
+        series_formatter = CustomJSHover(
+            args=dict(labels=self.labels), code="return labels[Math.floor(value)] ?? ''"
+        )
+        p.add_tools(
+            HoverTool(
+                tooltips=[
+                    ("time", "$x{%F %H:%M}"),
+                    ("series", "$y{custom}"),
+                    (self.variable, "@image"),
+                    ("mean of", "@count values"),
+                ],
+                formatters={"$x": "datetime", "$y": series_formatter},
+            )
+        )
+        p.on_event(RangesUpdate, self.ranges_update)
+        return p
+
+
+@timed()
+def fig_object_timeseries_heatmap(model_container, variable, data):
+    return HeatmapPlot(data, variable).figure()
+
+
 TIMESERIES_FUNCTIONS = {
     "Bar": fig_object_timeseries_bar,
     "Line": fig_object_timeseries_line,
     "Duration": fig_object_timeseries_duration,
+    "Heatmap": fig_object_timeseries_heatmap,
 }
 
 
+def fig_object_timeseries(model_container, variable, plot_type, data, query=None):
+    """
+    Returns the figure of `data` for `plot_type`, one of `TIMESERIES_FUNCTIONS`.
+
+    If `data` is the whole result of `query`, as returned by `query_timeseries`,
+    results derived from it (the sorted data of duration plots) are cached by
+    that query.
+
+    """
+    if plot_type == "Duration":
+        return fig_object_timeseries_duration(model_container, variable, data, query)
+    return TIMESERIES_FUNCTIONS[plot_type](model_container, variable, data)
+
+
+@timed()
 def fig_timeseries(model_container, variable, plot_type, time_res, sum_by, **selectors):
-    data = data_timeseries(model_container, variable, time_res, sum_by, **selectors)
-    fig = TIMESERIES_FUNCTIONS[plot_type](model_container, variable, data)
+    data = data_timeseries(
+        model_container, variable, time_res, sum_by=sum_by, **selectors
+    )
+    query = query_timeseries(
+        model_container, variable, time_res, sum_by=sum_by, **selectors
+    )
+    fig = fig_object_timeseries(model_container, variable, plot_type, data, query)
     return fig
 
 
+@timed()
 def fig_timeseries_with_subset(
     model_container, variable, plot_type, time_res, time_range, sum_by, **selectors
 ):
     data = data_timeseries(
         model_container, variable, time_res, time_range, sum_by, **selectors
     )
-    fig = TIMESERIES_FUNCTIONS[plot_type](model_container, variable, data)
+    # Time subsets are one-off queries, not worth caching results for
+    query = (
+        query_timeseries(
+            model_container, variable, time_res, sum_by=sum_by, **selectors
+        )
+        if time_range is None
+        else None
+    )
+    fig = fig_object_timeseries(model_container, variable, plot_type, data, query)
     return fig
 
 
+class TimeWindow:
+    """
+    Long-format timeseries data from which the rows within a time range are
+    sliced by binary search on the sorted timesteps, instead of being queried
+    from the model again.
+
+    Data in which every series has the same timesteps, one series after the
+    other, as returned by `get_df_timeseries`, is sliced as one block per
+    series and keeps its row order. Any other data is sorted by timestep once,
+    so that its rows are returned in timestep order.
+
+    Args:
+        data (pd.DataFrame): Long-format data with a `timesteps` column.
+
+    """
+
+    def __init__(self, data: pd.DataFrame):
+        row_timesteps = data.timesteps.to_numpy()
+        self.timesteps = np.unique(row_timesteps)
+        n_series, remainder = divmod(len(row_timesteps), max(len(self.timesteps), 1))
+        if remainder == 0 and np.array_equal(
+            row_timesteps.reshape(n_series, -1),
+            np.broadcast_to(self.timesteps, (n_series, len(self.timesteps))),
+        ):
+            self.data = data
+            self._n_series = n_series
+        else:
+            self.data = data.iloc[np.argsort(row_timesteps, kind="stable")]
+            self._n_series = None
+            self._row_timesteps = self.data.timesteps.to_numpy()
+
+    def select(self, time_range) -> pd.DataFrame:
+        """
+        Returns the rows with timesteps from `time_range[0]` to `time_range[1]`,
+        both included.
+
+        """
+        start, end = (pd.Timestamp(i).to_datetime64() for i in time_range)
+        if self._n_series is None:
+            lo = np.searchsorted(self._row_timesteps, start, side="left")
+            hi = np.searchsorted(self._row_timesteps, end, side="right")
+            return self.data.iloc[lo:hi].reset_index(drop=True)
+
+        lo = np.searchsorted(self.timesteps, start, side="left")
+        hi = np.searchsorted(self.timesteps, end, side="right")
+        rows = np.arange(self._n_series)[:, np.newaxis] * len(self.timesteps)
+        rows = (rows + np.arange(lo, hi)).ravel()
+        return self.data.iloc[rows].reset_index(drop=True)
+
+
+class TimeseriesSliderPlot:
+    """
+    Timeseries figure with a slider selecting the time range it shows.
+
+    The data for the current filters is fetched once, and every slider
+    movement is served from it by a `TimeWindow`. While the slider is dragged,
+    the figure is updated at most once every `THROTTLE_MS` milliseconds, with
+    the latest range. The figure pane is kept and only its object replaced
+    by the new figure. For Plotly figures, the pane then compares the arrays
+    of every trace against those already sent and only sends the changed
+    ones, along with the layout; other figures, e.g. heatmaps, are sent whole.
+
+    Args:
+        model_container (ModelContainer): The model.
+        variable (str): The variable to plot.
+        plot_type (str): One of `TIMESERIES_FUNCTIONS`.
+        data (pd.DataFrame): Long-format data for all timesteps.
+        slider (pn.widgets.DatetimeRangeSlider): The time range slider.
+        query (dict, optional): Normalised query of `data`, by which results
+            derived from it are cached while the slider covers all timesteps.
+
+    """
+
+    THROTTLE_MS = 100
+
+    def __init__(self, model_container, variable, plot_type, data, slider, query=None):
+        self.model_container = model_container
+        self.variable = variable
+        self.plot_type = plot_type
+        self.query = query
+        self.window = TimeWindow(data)
+        self.slider = slider
+        self.pane = pn.panel(self.figure(slider.value))
+        self._pending = None
+        slider.param.watch(self._slider_changed, "value")
+
+    @timed()
+    def figure(self, time_range):
+        data = self.window.select(time_range)
+        # Results for windows of the data are not cached
+        query = self.query if len(data) == len(self.window.data) else None
+        return fig_object_timeseries(
+            self.model_container, self.variable, self.plot_type, data, query
+        )
+
+    def _slider_changed(self, event):
+        # Outside a server session, e.g. in a notebook, update right away
+        doc = pn.state.curdoc
+        if doc is None or doc.session_context is None:
+            self.pane.object = self.figure(event.new)
+            return
+        if self._pending is None:
+            doc.add_timeout_callback(self._update, self.THROTTLE_MS)
+        self._pending = event.new
+
+    def _update(self):
+        time_range, self._pending = self._pending, None
+        if time_range is not None:
+            self.pane.object = self.figure(time_range)
+
+
+@timed()
 def pane_timeseries_plot_with_slider(
     ui_view, variable, plot_type, sum_by, time_res, **selectors
 ):
     model_container = ui_view.model_container
 
-    data_for_widget_init = data_timeseries(
-        model_container, variable, time_res, **selectors
+    data = data_timeseries(
+        model_container, variable, time_res, sum_by=sum_by.lower(), **selectors
     )
+    timesteps = np.unique(data.timesteps.to_numpy())
 
     STEP_SIZES = {
         "Monthly": 60000 * 60 * 24 * 30,
@@ -160,38 +693,27 @@ def pane_timeseries_plot_with_slider(
 
     # For the end point of the range selector, either use the pre-defined value
     # from END_SELECTIONS or the actual available data length, whichever is smaller
-    end_index = min(END_SELECTIONS[time_res], len(data_for_widget_init) - 1)
+    end_index = min(END_SELECTIONS[time_res], len(timesteps) - 1)
 
     widget_datetime_range_slider = pn.widgets.DatetimeRangeSlider(
         name="Time subset",
-        start=data_for_widget_init.timesteps.iloc[0],
-        end=data_for_widget_init.timesteps.iloc[-1],
-        value=(
-            data_for_widget_init.timesteps.iloc[0],
-            data_for_widget_init.timesteps.iloc[end_index],
-        ),
+        start=pd.Timestamp(timesteps[0]),
+        end=pd.Timestamp(timesteps[-1]),
+        value=(pd.Timestamp(timesteps[0]), pd.Timestamp(timesteps[end_index])),
         step=STEP_SIZES[time_res],
         format=FORMATS[time_res],
         sizing_mode="stretch_width",
     )
 
-    # Bind widget_datetime_range_slider to fig_object_timeseries
-    fig_pane = pn.bind(
-        fig_timeseries_with_subset,
-        model_container=model_container,
-        variable=variable,
-        plot_type=plot_type,
-        time_res=time_res,
-        time_range=widget_datetime_range_slider,
-        sum_by=sum_by.lower(),
-        **selectors,
+    query = query_timeseries(
+        model_container, variable, time_res, sum_by=sum_by.lower(), **selectors
     )
-
-    return pn.Column(
-        fig_pane,  # pn.pane.Plotly(fig_pane, sizing_mode="stretch_both"),
-        widget_datetime_range_slider,
+    plot = TimeseriesSliderPlot(
+        model_container, variable, plot_type, data, widget_datetime_range_slider, query
     )
 
+    return pn.Column(plot.pane, widget_datetime_range_slider)
+
 
 def pane_timeseries(ui_view, **selectors):
 
@@ -207,7 +729,7 @@ def pane_timeseries(ui_view, **selectors):
     )
 
     widget_plot_type_ts = pn.widgets.RadioButtonGroup(
-        options=["Bar", "Line", "Duration"], value="Bar"
+        options=list(TIMESERIES_FUNCTIONS), value="Bar"
     )
 
     btn_sumover_ts = pn.widgets.RadioButtonGroup(
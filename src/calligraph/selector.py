@@ -0,0 +1,198 @@
+import numpy as np
+import pandas as pd
+import panel as pn
+import param
+from panel.viewable import Viewer
+from panel.widgets.base import WidgetBase
+
+
+class CoordSelector(WidgetBase, Viewer):
+    """
+    Selector of coordinate members that scales to thousands of members.
+
+    The selection is kept on the server, as a mask over `options`, and `value`
+    lists the selected members in the order of `options`. The browser is only
+    sent the `PAGE_SIZE` members on the current page of those matching the
+    search text, and a summary of the selection, e.g. "All except 3". Searching
+    and paging are done on the server. As a widget, it can be passed to
+    `pn.bind` like any other, which binds its `value`.
+
+    `value` stays a list of the selected labels, which takes memory linear in
+    the number of selected members, as that is what bound functions resolve
+    to positions with `ModelContainer.get_selection`. It is only rebuilt when
+    the selection changes, and `all_selected` tells whether everything is
+    selected without looking at it.
+
+    Args:
+        options (list): All members.
+        value (list, optional): Selected members. Defaults to all.
+        label (str): Label shown above the search box.
+
+    """
+
+    PAGE_SIZE = 20
+    SUMMARY_MEMBERS = 3
+
+    value = param.List(default=[])
+    options = param.List(default=[])
+
+    def __init__(self, **params):
+        params.setdefault("value", params.get("options", []))
+        super().__init__(**params)
+        self.search = ""
+        self.page = 0
+        self._view = None
+        self._updating = False
+        self._options_changed()
+        self.param.watch(self._options_changed, "options")
+        self.param.watch(self._value_changed, "value")
+
+    def _options_changed(self, *events):
+        self._index = pd.Index(self.options)
+        self._labels = pd.Series(self._index.astype(str)).str.lower()
+        self._mask = self._index.isin(self.value)
+        self._update_matches()
+        # Members no longer in the options are no longer selected
+        if events and len(self.value) != self._mask.sum():
+            self.value = self._index[self._mask].to_list()
+        self._refresh()
+
+    def _value_changed(self, event):
+        if self._updating:
+            return
+        self._mask = self._index.isin(event.new)
+        self._refresh()
+
+    def _set_mask(self, mask):
+        self._mask = mask
+        self._updating = True
+        try:
+            self.value = self._index[mask].to_list()
+        finally:
+            self._updating = False
+        self._refresh()
+
+    def _update_matches(self):
+        if self.search:
+            matches = self._labels.str.contains(self.search.lower(), regex=False)
+            self._matches = np.flatnonzero(matches.to_numpy())
+        else:
+            self._matches = np.arange(len(self._index))
+        self.page = 0
+
+    def _page_positions(self):
+        start = self.page * self.PAGE_SIZE
+        return self._matches[start : start + self.PAGE_SIZE]
+
+    @property
+    def all_selected(self) -> bool:
+        return bool(self._mask.all())
+
+    @property
+    def n_pages(self) -> int:
+        return max(-(-len(self._matches) // self.PAGE_SIZE), 1)
+
+    def select_all(self):
+        """
+        Selects all members matching the search text.
+
+        """
+        mask = self._mask.copy()
+        mask[self._matches] = True
+        self._set_mask(mask)
+
+    def select_none(self):
+        """
+        Deselects all members matching the search text.
+
+        """
+        mask = self._mask.copy()
+        mask[self._matches] = False
+        self._set_mask(mask)
+
+    def summary(self) -> str:
+        """
+        Returns a short description of the selection, naming its members, or
+        those not selected, if there are few enough of them.
+
+        """
+        total = len(self._mask)
+        selected = int(self._mask.sum())
+        if selected == total:
+            return f"All {total} selected"
+        if selected == 0:
+            return "None selected"
+        if total - selected <= selected:
+            excluded = self._index[~self._mask]
+            if len(excluded) <= self.SUMMARY_MEMBERS:
+                return "All except " + ", ".join(map(str, excluded))
+            return f"All except {len(excluded)}"
+        if selected <= self.SUMMARY_MEMBERS:
+            return "Only " + ", ".join(map(str, self._index[self._mask]))
+        return f"{selected} of {total} selected"
+
+    def _search_changed(self, event):
+        self.search = event.new
+        self._update_matches()
+        self._refresh()
+
+    def _turn_page(self, step):
+        self.page = min(max(self.page + step, 0), self.n_pages - 1)
+        self._refresh()
+
+    def _checkboxes_changed(self, event):
+        if self._updating:
+            return
+        positions = self._page_positions()
+        mask = self._mask.copy()
+        mask[positions] = self._index[positions].isin(event.new)
+        self._set_mask(mask)
+
+    def _refresh(self):
+        # Only the visible page and the summary are sent to the browser
+        if self._view is None:
+            return
+        positions = self._page_positions()
+        self._updating = True
+        try:
+            self._checkboxes.options = {
+                str(i): i for i in self._index[positions].to_list()
+            }
+            self._checkboxes.value = self._index[
+                positions[self._mask[positions]]
+            ].to_list()
+        finally:
+            self._updating = False
+        start = self.page * self.PAGE_SIZE
+        self._page_label.object = (
+            f"{start + 1}–{start + len(positions)} of {len(self._matches)}"
+            if len(positions)
+            else "No matches"
+        )
+        self._btn_previous.disabled = self.page == 0
+        self._btn_next.disabled = self.page >= self.n_pages - 1
+        self._summary.object = self.summary()
+
+    def __panel__(self):
+        if self._view is None:
+            search = pn.widgets.TextInput(
+                name=self.label, placeholder="Search", sizing_mode="stretch_width"
+            )
+            search.param.watch(self._search_changed, "value_input")
+            self._checkboxes = pn.widgets.CheckBoxGroup(inline=False)
+            self._checkboxes.param.watch(self._checkboxes_changed, "value")
+            self._btn_previous = pn.widgets.Button(icon="chevron-left", width=40)
+            self._btn_previous.on_click(lambda event: self._turn_page(-1))
+            self._btn_next = pn.widgets.Button(icon="chevron-right", width=40)
+            self._btn_next.on_click(lambda event: self._turn_page(1))
+            self._page_label = pn.pane.Markdown(margin=(0, 10))
+            self._summary = pn.pane.Markdown(margin=(0, 10))
+            self._view = pn.Column(
+                search,
+                self._summary,
+                self._checkboxes,
+                pn.Row(self._btn_previous, self._page_label, self._btn_next),
+                sizing_mode="stretch_width",
+            )
+            self._refresh()
+        return self._view
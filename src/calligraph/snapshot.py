@@ -0,0 +1,321 @@
+import hashlib
+import html
+import itertools
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+from plotly.offline import get_plotlyjs
+
+from calligraph import plot
+from calligraph.core import ModelContainer, get_model_summary_df
+from calligraph.ui import UIView
+
+LOGGER = logging.getLogger(__name__)
+
+RESOLUTIONS = ["Monthly", "Weekly", "Daily", "Original resolution"]
+DEFAULT_RESOLUTIONS = ["Monthly", "Weekly", "Daily"]
+
+# Heatmaps are rendered on the server as the view changes, so are left out
+PLOT_TYPES = ["Bar", "Line", "Duration"]
+SUM_BY = ["Nodes", "Techs"]
+
+
+def filter_presets(model_container: ModelContainer, coords=["carriers"]) -> dict:
+    """
+    Returns named filter presets: "All", and one per member of each of `coords`
+    (e.g. one per carrier), as selectors.
+
+    """
+    presets = {"All": {}}
+    for coord in coords:
+        for member in model_container.combined_data.coords[coord].to_index():
+            presets[f"{coord.capitalize()}: {member}"] = {coord: [member]}
+    return presets
+
+
+class Snapshot:
+    """
+    Precomputed figures for a bounded set of widget states of the app, written
+    as a single self-contained HTML file that needs no server to browse.
+
+    Every state of a page is the combination of one option per widget, e.g.
+    variable, plot type and filter preset. The arrays and templates of all
+    figures are kept in one pool, in which identical ones (e.g. the timesteps
+    of every timeseries figure at the same resolution) are stored once.
+    Numeric arrays are stored in Plotly's binary (base64) format.
+
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.states = {}
+        self.pool = []
+        self._pool_index = {}
+
+    def add_page(self, page: str, widgets: dict) -> None:
+        """
+        Adds `page`, with its `widgets` given as a dict of widget names to lists
+        of options.
+
+        """
+        self.pages[page] = widgets
+
+    def add_state(self, page: str, options: list, content) -> None:
+        """
+        Adds the figure (or HTML string) shown on `page` for the given `options`,
+        one per widget of the page, in order.
+
+        """
+        if not isinstance(content, str):
+            content = self._pooled(content.to_plotly_json())
+        self.states[self.state_key(page, options)] = content
+
+    @staticmethod
+    def state_key(page: str, options: list) -> str:
+        return "|".join([page, *[str(i) for i in options]])
+
+    def _pooled(self, obj):
+        # Replaces arrays and templates by references into the pool
+        if isinstance(obj, dict):
+            if "bdata" in obj:
+                return self._ref(obj)
+            return {
+                k: (self._ref(v) if k == "template" else self._pooled(v))
+                for k, v in obj.items()
+            }
+        if isinstance(obj, np.ndarray):
+            return self._ref(obj.tolist())
+        if isinstance(obj, (list, tuple)):
+            if len(obj) > 2 and not isinstance(obj[0], (dict, list, tuple)):
+                return self._ref(list(obj))
+            return [self._pooled(i) for i in obj]
+        return obj
+
+    def _ref(self, value) -> dict:
+        text = json.dumps(value, sort_keys=True, default=str)
+        key = hashlib.sha256(text.encode()).hexdigest()
+        if key not in self._pool_index:
+            self._pool_index[key] = len(self.pool)
+            self.pool.append(text)
+        return {"$ref": self._pool_index[key]}
+
+    def to_html(self, title: str) -> str:
+        data = (
+            '{"pages": '
+            + json.dumps(self.pages, default=str)
+            + ', "states": '
+            + json.dumps(self.states, default=str)
+            + ', "pool": ['
+            + ",".join(self.pool)
+            + "]}"
+        )
+        return HTML_TEMPLATE.format(
+            title=html.escape(title),
+            header_background=UIView.HEADER_BACKGROUND_COLOR,
+            header_color=UIView.HEADER_TEXT_COLOR,
+            plotlyjs=get_plotlyjs(),
+            # Keep the data from closing its script element
+            data=data.replace("</", "<\\/"),
+        )
+
+    def write(self, path: str | Path, title: str) -> None:
+        Path(path).write_text(self.to_html(title), encoding="utf-8")
+
+
+def build_snapshot(
+    model_container: ModelContainer,
+    variables: list | None = None,
+    resolutions: list = DEFAULT_RESOLUTIONS,
+    presets: dict | None = None,
+) -> Snapshot:
+    """
+    Precomputes the Home, non-timeseries and timeseries pages of the app for
+    every combination of the given variables, time resolutions and filter
+    presets, and of all plot types and sum-over options.
+
+    Args:
+        model_container (ModelContainer)
+        variables (list, optional): Variables to include. Defaults to all
+            results variables.
+        resolutions (list): Time resolutions of timeseries plots, out of
+            `RESOLUTIONS`.
+        presets (dict, optional): Filter presets as returned by
+            `filter_presets`. Defaults to "All" and one per carrier.
+
+    """
+    if variables is None:
+        variables = [
+            var for var, v in model_container.catalog.items() if v["group"] == "results"
+        ]
+    if presets is None:
+        presets = filter_presets(model_container)
+    static_variables = [
+        var
+        for var in model_container.variables["variables_notimesteps"]
+        if var in variables
+    ]
+    timeseries_variables = [
+        var
+        for var in model_container.variables["variables_timesteps"]
+        if var in variables or (var == "flow*" and "flow_out" in variables)
+    ]
+
+    snapshot = Snapshot()
+
+    snapshot.add_page("Home", {})
+    snapshot.add_state(
+        "Home", [], get_model_summary_df(model_container).to_html(border=0)
+    )
+
+    widgets = {"Variable": static_variables, "Filter": list(presets)}
+    snapshot.add_page("Non-timeseries plots", widgets)
+    for variable, preset in itertools.product(*widgets.values()):
+        _add_state(
+            snapshot,
+            "Non-timeseries plots",
+            [variable, preset],
+            lambda: plot.fig_static(model_container, variable, **presets[preset]),
+        )
+
+    widgets = {
+        "Variable": timeseries_variables,
+        "Plot type": PLOT_TYPES,
+        "Sum over": SUM_BY,
+        "Time resolution": resolutions,
+        "Filter": list(presets),
+    }
+    snapshot.add_page("Timeseries plots", widgets)
+    for variable, sum_by, time_res, preset in itertools.product(
+        timeseries_variables, SUM_BY, resolutions, list(presets)
+    ):
+        try:
+            data = plot.data_timeseries(
+                model_container,
+                variable,
+                time_res,
+                sum_by=sum_by.lower(),
+                **presets[preset],
+            )
+        except Exception as e:
+            LOGGER.warning(f"Skipping {variable} ({sum_by}, {time_res}, {preset}): {e}")
+            continue
+        query = plot.query_timeseries(
+            model_container,
+            variable,
+            time_res,
+            sum_by=sum_by.lower(),
+            **presets[preset],
+        )
+        for plot_type in PLOT_TYPES:
+            _add_state(
+                snapshot,
+                "Timeseries plots",
+                [variable, plot_type, sum_by, time_res, preset],
+                lambda: plot.fig_object_timeseries(
+                    model_container, variable, plot_type, data, query
+                ),
+            )
+
+    return snapshot
+
+
+def _add_state(snapshot, page, options, make_figure):
+    # States that cannot be shown, e.g. as a preset leaves no data, are left
+    # out and shown as such in the snapshot
+    try:
+        figure = make_figure()
+    except Exception as e:
+        LOGGER.warning(f"Skipping {page} {options}: {e}")
+        return
+    snapshot.add_state(page, options, figure)
+
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ margin: 0; font-family: system-ui, sans-serif; }}
+header {{ background: {header_background}; color: {header_color}; padding: 10px 20px; }}
+header h1 {{ display: inline-block; margin: 0 20px 0 0; font-size: 1.4em; }}
+header button {{ margin-right: 5px; }}
+#widgets {{ padding: 10px 20px; }}
+#widgets label {{ margin-right: 15px; }}
+#content {{ padding: 0 20px; }}
+#figure {{ height: 600px; }}
+table {{ border-collapse: collapse; }}
+td, th {{ padding: 2px 10px; text-align: left; }}
+</style>
+<script>{plotlyjs}</script>
+</head>
+<body>
+<header><h1>{title}</h1><span id="navbar"></span></header>
+<div id="widgets"></div>
+<div id="content"><div id="message"></div><div id="figure"></div></div>
+<script type="application/json" id="snapshot">{data}</script>
+<script>
+const snapshot = JSON.parse(document.getElementById("snapshot").textContent);
+const selected = {{}};
+let page = "Home";
+
+function resolve(obj) {{
+  if (Array.isArray(obj)) return obj.map(resolve);
+  if (obj === null || typeof obj !== "object") return obj;
+  // Copied, as Plotly may modify the (shared) arrays it is given
+  if ("$ref" in obj) return structuredClone(snapshot.pool[obj["$ref"]]);
+  const result = {{}};
+  for (const [k, v] of Object.entries(obj)) result[k] = resolve(v);
+  return result;
+}}
+
+function render() {{
+  const widgets = snapshot.pages[page];
+  const key = [page, ...Object.keys(widgets).map((w) => selected[page][w])].join("|");
+  const state = snapshot.states[key];
+  const figure = document.getElementById("figure");
+  const message = document.getElementById("message");
+  if (state === undefined) {{
+    Plotly.purge(figure);
+    message.innerHTML = "<p>No data for this selection.</p>";
+  }} else if (typeof state === "string") {{
+    Plotly.purge(figure);
+    message.innerHTML = state;
+  }} else {{
+    message.innerHTML = "";
+    const fig = resolve(state);
+    Plotly.react(figure, fig.data, fig.layout, {{responsive: true}});
+  }}
+}}
+
+function showPage(name) {{
+  page = name;
+  const container = document.getElementById("widgets");
+  container.innerHTML = "";
+  selected[page] = selected[page] || {{}};
+  for (const [widget, options] of Object.entries(snapshot.pages[page])) {{
+    const select = document.createElement("select");
+    for (const option of options) select.add(new Option(option, option));
+    select.value = selected[page][widget] ?? options[0];
+    selected[page][widget] = select.value;
+    select.onchange = () => {{ selected[page][widget] = select.value; render(); }};
+    const label = document.createElement("label");
+    label.append(widget + " ", select);
+    container.append(label);
+  }}
+  render();
+}}
+
+for (const name of Object.keys(snapshot.pages)) {{
+  const button = document.createElement("button");
+  button.textContent = name;
+  button.onclick = () => showPage(name);
+  document.getElementById("navbar").append(button);
+}}
+showPage(page);
+</script>
+</body>
+</html>
+"""
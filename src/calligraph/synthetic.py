@@ -0,0 +1,167 @@
+from pathlib import Path
+
+import calliope
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+def generate_model(
+    path: str | Path,
+    nodes: int = 10,
+    techs: int = 10,
+    carriers: int = 1,
+    links: int | None = None,
+    timesteps: int = 168,
+    seed: int = 0,
+) -> Path:
+    """
+    Writes a synthetic Calliope model with random results to a NetCDF file at
+    `path`, with the same structure as a solved model. Useful to test and
+    benchmark calligraph at scales for which no real model is at hand.
+
+    The inputs are built by Calliope itself; the results are random numbers
+    consistent with the inputs (e.g. flows only where a tech has a carrier).
+
+    Args:
+        path (str | Path): Where to write the NetCDF file.
+        nodes (int): Number of nodes.
+        techs (int): Number of supply techs, all available at every node. One
+            demand tech per carrier is added on top.
+        carriers (int): Number of carriers. Techs and links are assigned
+            to carriers in turn.
+        links (int, optional): Number of transmission links. The first
+            `nodes - 1` links connect all nodes in a chain, further links connect
+            random pairs of nodes. Defaults to `nodes - 1`.
+        timesteps (int): Number of hourly timesteps, starting 2005-01-01.
+        seed (int): Seed for the random number generator.
+
+    Returns:
+        Path: `path`
+    """
+    rng = np.random.default_rng(seed)
+    if links is None:
+        links = max(nodes - 1, 0)
+
+    carrier_names = [f"carrier_{i}" for i in range(carriers)]
+    node_names = [f"node_{i:04d}" for i in range(nodes)]
+    supply_techs = {
+        f"supply_{i:04d}": dict(
+            base_tech="supply",
+            carrier_out=carrier_names[i % carriers],
+            flow_cap_max=float(rng.uniform(10, 1000)),
+            color=_random_color(rng),
+            cost_flow_cap=dict(
+                data=float(rng.uniform(100, 2000)), index="monetary", dims="costs"
+            ),
+        )
+        for i in range(techs)
+    }
+    demand_techs = {
+        f"demand_{carrier}": dict(
+            base_tech="demand", carrier_in=carrier, color=_random_color(rng)
+        )
+        for carrier in carrier_names
+    }
+    transmission_techs = {
+        f"link_{i:04d}": dict(
+            base_tech="transmission",
+            link_from=node_names[node_from],
+            link_to=node_names[node_to],
+            carrier_in=carrier_names[i % carriers],
+            carrier_out=carrier_names[i % carriers],
+            flow_cap_max=float(rng.uniform(10, 1000)),
+            color=_random_color(rng),
+        )
+        for i, (node_from, node_to) in enumerate(_link_pairs(rng, nodes, links))
+    }
+
+    node_techs = {tech: None for tech in [*supply_techs, *demand_techs]}
+    model_definition = dict(
+        config=dict(
+            init=dict(
+                name=f"Synthetic model ({nodes} nodes, {techs} techs, "
+                f"{carriers} carriers, {links} links, {timesteps} timesteps)"
+            )
+        ),
+        data_definitions=dict(
+            objective_cost_weights=dict(data=1, index="monetary", dims="costs")
+        ),
+        techs={**supply_techs, **demand_techs, **transmission_techs},
+        nodes={
+            node: dict(
+                latitude=float(rng.uniform(36, 60)),
+                longitude=float(rng.uniform(-9, 30)),
+                techs=node_techs,
+            )
+            for node in node_names
+        },
+        data_tables=dict(
+            demand=dict(
+                data="demand",
+                rows="timesteps",
+                columns=["nodes", "techs"],
+                add_dims=dict(parameters="sink_use_equals"),
+            )
+        ),
+    )
+    demand = pd.DataFrame(
+        rng.uniform(10, 100, size=(timesteps, nodes * carriers)),
+        index=pd.date_range("2005-01-01", periods=timesteps, freq="h"),
+        columns=pd.MultiIndex.from_product([node_names, list(demand_techs)]),
+    )
+
+    model = calliope.read_dict(model_definition, data_table_dfs={"demand": demand})
+    model.results = _random_results(model.inputs, rng)
+    model.to_netcdf(path)
+    return Path(path)
+
+
+def _random_color(rng: np.random.Generator) -> str:
+    return "#" + rng.bytes(3).hex()
+
+
+def _link_pairs(rng: np.random.Generator, nodes: int, links: int):
+    pairs = [(i, i + 1) for i in range(min(links, nodes - 1))]
+    while len(pairs) < links:
+        node_from, node_to = sorted(rng.choice(nodes, size=2, replace=False))
+        pairs.append((int(node_from), int(node_to)))
+    return pairs
+
+
+def _random_results(inputs: xr.Dataset, rng: np.random.Generator) -> xr.Dataset:
+    carrier_out = inputs.carrier_out.fillna(False).astype(bool)
+    carrier_in = inputs.carrier_in.fillna(False).astype(bool)
+    defined = inputs.definition_matrix.fillna(False).astype(bool)
+
+    flow_cap = xr.where(
+        defined,
+        xr.DataArray(rng.uniform(0, 1000, defined.shape), dims=defined.dims),
+        np.nan,
+    )
+    profile = xr.DataArray(
+        rng.uniform(0, 1, (len(inputs.timesteps),) + defined.shape),
+        dims=("timesteps",) + defined.dims,
+    )
+    flow_out = xr.where(carrier_out, flow_cap * profile, np.nan)
+    flow_in = xr.where(carrier_in, flow_cap * profile.roll(timesteps=1), np.nan)
+
+    techs_defined = defined.any("carriers")
+    cost = xr.where(
+        techs_defined,
+        xr.DataArray(
+            rng.uniform(0, 1e6, (len(inputs.costs),) + techs_defined.shape),
+            dims=("costs",) + techs_defined.dims,
+        ),
+        np.nan,
+    )
+
+    return xr.Dataset(
+        dict(
+            flow_cap=flow_cap,
+            flow_out=flow_out.transpose(*defined.dims, "timesteps"),
+            flow_in=flow_in.transpose(*defined.dims, "timesteps"),
+            cost=cost,
+        ),
+        coords=inputs.coords,
+    )
@@ -0,0 +1,219 @@
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import urllib.request
+from concurrent.futures import Future
+from pathlib import Path
+
+import panel as pn
+import tornado.web
+import xyzservices
+import xyzservices.providers as xyz
+from tornado.ioloop import IOLoop
+
+import calligraph
+
+LOGGER = logging.getLogger(__name__)
+
+# Provider of the tiles loaded by the browser, and of those fetched by the
+# server for a `TileCache`, which needs one that takes requests without a key
+DEFAULT_PROVIDER = xyz.Stadia.StamenTonerLite
+DEFAULT_CACHE_PROVIDER = xyz.OpenStreetMap.Mapnik
+
+# Path under which the calligraph server serves tiles, below its prefix
+TILE_ROUTE = r"/tiles/(\d+)/(\d+)/(\d+)\.png"
+
+
+def tile_url() -> str:
+    """
+    Returns the URL template for Bokeh tile sources of the tiles served at
+    `TILE_ROUTE`, relative to the page of the current session, so that it
+    holds when the app is served under a prefix or behind a proxy.
+
+    """
+    root = f"{pn.state.rel_path}/" if pn.state.rel_path else ""
+    return root + "tiles/{Z}/{X}/{Y}.png"
+
+
+def with_api_key(
+    provider: xyzservices.TileProvider, api_key: str
+) -> xyzservices.TileProvider:
+    """
+    Returns `provider` with `api_key` filled in: in place of its key
+    placeholders if it has any, otherwise as the `api_key` query parameter
+    (as for Stadia Maps).
+
+    """
+    placeholders = {
+        k: api_key
+        for k, v in provider.items()
+        if isinstance(v, str) and v.lower().startswith("<insert")
+    }
+    if placeholders:
+        return provider(**placeholders)
+    separator = "&" if "?" in provider.url else "?"
+    return provider(url=f"{provider.url}{separator}api_key={api_key}")
+
+
+class TileCache:
+    """
+    Map tiles stored on disk, looked up in an optional archive first and
+    fetched from the upstream provider on a miss unless `offline` is set.
+
+    Fetched tiles are written to `cache_dir` as `{z}/{x}/{y}.png`, so that
+    later requests, from any session, are served from disk. Concurrent
+    requests for the same missing tile share a single upstream fetch.
+
+    Args:
+        cache_dir (str | Path): Directory in which tiles are cached.
+        provider (xyzservices.TileProvider): Upstream tile provider, which
+            must not require a key unless `api_key` is given.
+        archive (str | Path, optional): MBTiles file, or directory of tiles laid
+            out as `{z}/{x}/{y}.png`, to serve tiles from before the cache.
+        offline (bool): Never fetch tiles from the upstream provider.
+        retina (bool): Fetch high-resolution tiles where the provider has them.
+        timeout (float): Timeout for upstream requests in seconds.
+        api_key (str, optional): Key for the upstream provider.
+
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path,
+        provider: xyzservices.TileProvider = DEFAULT_CACHE_PROVIDER,
+        archive: str | Path | None = None,
+        offline: bool = False,
+        retina: bool = True,
+        timeout: float = 10,
+        api_key: str | None = None,
+    ):
+        if api_key is not None:
+            provider = with_api_key(provider, api_key)
+        if provider.requires_token() and not offline:
+            raise ValueError(f"Tile provider {provider.name} requires an API key")
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.provider = provider
+        self.archive = Path(archive) if archive is not None else None
+        self.offline = offline
+        self.retina = retina
+        self.timeout = timeout
+        self._mbtiles = None
+        if self.archive is not None and self.archive.is_file():
+            self._mbtiles = sqlite3.connect(
+                f"file:{self.archive}?mode=ro", uri=True, check_same_thread=False
+            )
+        self._lock = threading.Lock()
+        self._fetching = {}
+
+    @property
+    def attribution(self) -> str:
+        return self.provider.html_attribution
+
+    def get(self, z: int, x: int, y: int) -> bytes | None:
+        """
+        Returns the PNG data of the given tile, or None if it is not
+        available.
+
+        """
+        tile = self._read_archive(z, x, y)
+        if tile is None:
+            tile = self._read_cache(z, x, y)
+        if tile is None and not self.offline:
+            tile = self._fetch_shared(z, x, y)
+        return tile
+
+    def _cache_path(self, z, x, y) -> Path:
+        return self.cache_dir / str(z) / str(x) / f"{y}.png"
+
+    def _read_cache(self, z, x, y) -> bytes | None:
+        try:
+            return self._cache_path(z, x, y).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _read_archive(self, z, x, y) -> bytes | None:
+        if self.archive is None:
+            return None
+        if self._mbtiles is None:
+            try:
+                return (self.archive / str(z) / str(x) / f"{y}.png").read_bytes()
+            except FileNotFoundError:
+                return None
+        # MBTiles number rows from the bottom (TMS scheme)
+        with self._lock:
+            row = self._mbtiles.execute(
+                "SELECT tile_data FROM tiles "
+                "WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (z, x, 2**z - 1 - y),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def _fetch_shared(self, z, x, y) -> bytes | None:
+        key = (z, x, y)
+        with self._lock:
+            future = self._fetching.get(key)
+            owner = future is None
+            if owner:
+                future = self._fetching[key] = Future()
+        if owner:
+            try:
+                future.set_result(self._fetch(z, x, y))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    del self._fetching[key]
+        return future.result()
+
+    def _fetch(self, z, x, y) -> bytes | None:
+        kwargs = dict(scale_factor="@2x") if self.retina else dict()
+        url = self.provider.build_url(x=x, y=y, z=z, **kwargs)
+        request = urllib.request.Request(
+            url, headers={"User-Agent": f"calligraph/{calligraph.__version__}"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                tile = response.read()
+        except OSError as e:
+            LOGGER.warning(f"Fetching tile {z}/{x}/{y} failed: {e}")
+            return None
+
+        # Write atomically, so that concurrent readers never see partial tiles
+        path = self._cache_path(z, x, y)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as f:
+            f.write(tile)
+        os.replace(f.name, path)
+        return tile
+
+
+class TileHandler(tornado.web.RequestHandler):
+    """
+    Serves tiles from a `TileCache`, reading and fetching them off the event loop.
+
+    """
+
+    def initialize(self, tile_cache: TileCache):
+        self.tile_cache = tile_cache
+
+    async def get(self, z, x, y):
+        tile = await IOLoop.current().run_in_executor(
+            None, self.tile_cache.get, int(z), int(x), int(y)
+        )
+        if tile is None:
+            raise tornado.web.HTTPError(404)
+        self.set_header("Content-Type", "image/png")
+        self.set_header("Cache-Control", "public, max-age=86400")
+        self.write(tile)
+
+
+def tile_patterns(tile_cache: TileCache) -> list:
+    """
+    Returns the routes to pass to `pn.serve` as `extra_patterns` to serve tiles
+    from `tile_cache` at `TILE_ROUTE`.
+
+    """
+    return [(TILE_ROUTE, TileHandler, dict(tile_cache=tile_cache))]
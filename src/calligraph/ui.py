@@ -1,10 +1,15 @@
+import datetime
 import itertools
 
 import panel as pn
 from panel.template import BootstrapTemplate
+from tornado.ioloop import IOLoop
 
-from calligraph import pages
-from calligraph.core import ModelContainer
+from calligraph import pages, perf
+from calligraph.loader import ModelLoader
+from calligraph.perf import timed, timer
+from calligraph.selector import CoordSelector
+from calligraph.watch import ModelWatcher
 
 pn.extension("plotly")
 pn.extension("perspective")
@@ -19,37 +24,126 @@ class UIView:
     HEADER_BACKGROUND_COLOR = "#55b3f9"
     HEADER_TEXT_COLOR = "#ffffff"
 
-    def __init__(self, model_container):
-        self.model_container = model_container
+    def __init__(self, model_container, tile_cache=None):
+        # `model_container` may also be a `ModelLoader`, in which case the
+        # template is shown with a progress bar right away and filled in once
+        # the model has been loaded
+        self.tile_cache = tile_cache
         self.coord_selectors = {}
         self.filter_coords = []
-        self.view_coord_selectors = self._init_coord_selectors()
-        self.pages = self._init_pages()
+        self.view_coord_selectors = pn.Column()
         self.view_main = self._init_view_main()
-        self.view_navbar = self._init_navbar()
-        self.view = self._init_view()
+        self.view_navbar = pn.Row()
+        self.view_loading = self._init_view_loading()
+        self.model_container = None
+        self._stop_checking_revision = None
+        if isinstance(model_container, ModelLoader):
+            self.loader = model_container
+            self.view = self._init_view(title=self.loader.path.name)
+            if self.loader.model_container is None:
+                self.view.main[0].append(
+                    pn.pane.Markdown(f"Loading {self.loader.path.name}...")
+                )
+            else:
+                self._init_model(self.loader.model_container)
+            if not self.loader.done:
+                self._stop_checking_loader = self._add_periodic_callback(
+                    "loader", self._check_loader, period=250
+                )
+                self._check_loader()
+        else:
+            self.loader = None
+            self.view = self._init_view(title=model_container.name)
+            self._init_model(model_container)
+
+    def _init_model(self, model_container):
+        self.model_container = model_container
+        self.view.title = model_container.name
+        self.view_coord_selectors.objects = self._init_coord_selectors().objects
+        self.pages = self._init_pages()
+        self.view_navbar.objects = self._init_navbar().objects
         self.switch_page(list(self.pages.keys())[0])
         self._resettable_widgets = {}
         self._resettable_widgets_defaults = {}
+        self._revision = self._model_revision()
+        self._check_tracking_changes()
 
-    def __get_transmission_groups(self, group_param=""):
-        # FIXME this function can easily return nonsense depending on
-        # what `group_param` is passed in
-        transmission_techs = self.coord_selectors["techs_transmission"].options
-        model = self.model_container.model
-
-        if group_param in model.inputs:
-            groups = (
-                model.inputs[group_param]
-                .sel(techs=transmission_techs)
-                .to_dataframe()
-                .groupby(group_param)
-                .groups
+    def _check_tracking_changes(self):
+        if self.model_container.tracking_changes and not self._stop_checking_revision:
+            self._stop_checking_revision = self._add_periodic_callback(
+                "refresh", self._check_revision, period=1000
             )
-        else:  # e.g. it is None or ""
-            groups = {i: [i] for i in transmission_techs}
 
-        return groups
+    def _add_periodic_callback(self, name, callback, period):
+        # Calls `callback` every `period` milliseconds, and returns a function
+        # that stops doing so
+        if pn.state.curdoc and pn.state.curdoc.session_context:
+            # View of a single session
+            return pn.state.add_periodic_callback(callback, period=period).stop
+        else:
+            # View shared by all sessions, e.g. as served by the CLI
+            task = f"calligraph.{name}:{id(self)}"
+            pn.state.schedule_task(
+                task, callback, period=datetime.timedelta(milliseconds=period)
+            )
+            return lambda: pn.state.cancel_task(task)
+
+    def _init_view_loading(self):
+        self.progress = pn.indicators.Progress(
+            value=-1, active=True, sizing_mode="stretch_width"
+        )
+        self.progress_message = pn.pane.Markdown(sizing_mode="stretch_width")
+        return pn.Column(self.progress, self.progress_message, visible=False)
+
+    def _check_loader(self):
+        loader = self.loader
+        if loader.error is not None:
+            self._stop_checking_loader()
+            self.view_loading.visible = False
+            self.view.main[0].objects = [
+                pn.pane.Alert(
+                    f"Loading {loader.path} failed: {loader.error}", alert_type="danger"
+                )
+            ]
+            return
+        if self.model_container is None and loader.model_container is not None:
+            self._init_model(loader.model_container)
+        if loader.done:
+            self._stop_checking_loader()
+            self.view_loading.visible = False
+            self._check_tracking_changes()
+        else:
+            self.progress.value = loader.progress
+            self.progress.active = loader.progress < 0
+            self.progress_message.object = loader.message
+            self.view_loading.visible = True
+
+    def _model_revision(self):
+        return (self.model_container.revision, self.model_container.structure_revision)
+
+    def _check_revision(self):
+        revision = self._model_revision()
+        if revision != self._revision:
+            structure = revision[1] != self._revision[1]
+            self._revision = revision
+            self.refresh(structure=structure)
+
+    def refresh(self, structure=False):
+        """
+        Rebuilds the current page from the reloaded model, and the sidebar too
+        if the structure of the model has changed.
+
+        """
+        if structure:
+            self.coord_selectors = {}
+            self.filter_coords = []
+            self.view_coord_selectors.objects = self._init_coord_selectors().objects
+        else:
+            groups = self.transmission_groups
+            self._init_transmission_groups(self.transmission_group_param)
+            if self.transmission_groups != groups:
+                self._update_transmission_groups(self.transmission_group_param)
+        self.switch_page(self.current_page)
 
     def _coord_selector(
         self, coord: str, name=None, members=None, as_card=True, multichoice_name=""
@@ -64,22 +158,15 @@ class UIView:
         else:
             coord_members = members
 
-        choice = pn.widgets.MultiChoice(
-            value=coord_members, options=coord_members, name=multichoice_name
-        )
+        choice = CoordSelector(options=coord_members, label=multichoice_name)
         self.coord_selectors[coord] = choice
 
-        def filter_all():
-            choice.value = coord_members
-
+        # Both apply to the members matching the search text
         btn_filter_all = pn.widgets.Button(icon="plus", name="All")
-        btn_filter_all.on_click(lambda event: filter_all())
-
-        def filter_none():
-            choice.value = []
+        btn_filter_all.on_click(lambda event: choice.select_all())
 
         btn_filter_none = pn.widgets.Button(icon="minus", name="None")
-        btn_filter_none.on_click(lambda event: filter_none())
+        btn_filter_none.on_click(lambda event: choice.select_none())
 
         result = [
             choice,
@@ -102,7 +189,12 @@ class UIView:
         return selector
 
     def _init_transmission_groups(self, group_param):
-        self.transmission_groups = self.__get_transmission_groups(group_param)
+        self.transmission_group_param = group_param
+        self.transmission_groups = self.model_container.network.groups(group_param)
+        if group_param in self.model_container.catalog:
+            self.model_container.add_tech_grouping(
+                "transmission:" + group_param, self.transmission_groups
+            )
 
     def _update_transmission_groups(self, group_param):
         # FIXME: this should return some feedback based on whether or not the
@@ -114,8 +206,8 @@ class UIView:
 
     def __get_transmission_coord_selector(self, group_param):
         transmission_techs = self.model_container.get_base_tech_members("transmission")
-        self.coord_selectors["techs_transmission"] = pn.widgets.MultiChoice(
-            name="transmission", options=transmission_techs, value=transmission_techs
+        self.coord_selectors["techs_transmission"] = CoordSelector(
+            label="transmission", options=transmission_techs
         )
         self._init_transmission_groups(group_param)
         members = list(self.transmission_groups.keys())
@@ -143,8 +235,8 @@ class UIView:
             name="network_grouping_param", value=transmission_group_param
         )
 
-        self.coord_selectors["techs"] = pn.widgets.MultiChoice(
-            name="techs", options=self._get_tech_coords(), value=self._get_tech_coords()
+        self.coord_selectors["techs"] = CoordSelector(
+            label="techs", options=self._get_tech_coords()
         )
 
         pn.bind(
@@ -237,6 +329,10 @@ class UIView:
             "Map plots": dict(icon="map-2", view=pages.page_map),
             "Table view": dict(icon="table", view=pages.page_table),
         }
+        if perf.RECORDER.enabled:
+            page_collection["Performance"] = dict(
+                icon="stopwatch", view=pages.page_performance
+            )
         return page_collection
 
     def _init_navbar(self):
@@ -247,36 +343,41 @@ class UIView:
             button.on_click(lambda event: self.switch_page(event.obj.name))
         return pn.Row(*buttons)
 
+    @timed()
     def switch_page(self, page):
         # Assumes that every page generator function in self.pages[page]["view"] either
         # returns a single appropriate Panel object such as pn.Column or a list of a
         # maximum of panel of two panel objects
-        content = self.pages[page]["view"](self)
-        for i in range(len(self.view.main)):
-            self.view.main[i].clear()
-        if isinstance(content, list):
-            gstack = pn.layout.gridstack.GridStack(
-                sizing_mode="stretch_both",
-                min_height=600,
-                allow_drag=False,
-                allow_resize=False,
-            )
-            gstack[:, 0:6] = content[0]
-            gstack[:, 6:12] = content[1]
-            self.view.main[0].append(gstack)
-        else:
-            self.view.main[0].append(content)
+        self.current_page = page
+        with timer("switch_page.build", page=page):
+            content = self.pages[page]["view"](self)
+        # Replacing the main content is where Panel creates the Bokeh models
+        with timer("switch_page.layout", page=page):
+            for i in range(len(self.view.main)):
+                self.view.main[i].clear()
+            if isinstance(content, list):
+                gstack = pn.layout.gridstack.GridStack(
+                    sizing_mode="stretch_both",
+                    min_height=600,
+                    allow_drag=False,
+                    allow_resize=False,
+                )
+                gstack[:, 0:6] = content[0]
+                gstack[:, 6:12] = content[1]
+                self.view.main[0].append(gstack)
+            else:
+                self.view.main[0].append(content)
 
     def _init_view_main(self):
         return pn.Column()
 
-    def _init_view(self):
+    def _init_view(self, title):
         view = BootstrapTemplate(
             header_background=self.HEADER_BACKGROUND_COLOR,
             header_color=self.HEADER_TEXT_COLOR,
-            title=self.model_container.name,
+            title=title,
             header=[self.view_navbar],
-            sidebar=[self.view_coord_selectors],
+            sidebar=[self.view_loading, self.view_coord_selectors],
             main=[],
         )
         view.main.append(pn.Column())  # Column 0
@@ -306,7 +407,18 @@ class UIView:
         self._resettable_widgets[id].options = self.model_container.variables[variables]
 
 
-def app(path):
-    model_container = ModelContainer(path)
-    ui_view = UIView(model_container)
+def app(path, tile_cache=None, watch=None, **kwargs):
+    # The model is loaded in the background, so that the app can be served
+    # (showing the loading progress) right away
+    loader = ModelLoader(path, track_changes=watch is not None, **kwargs)
+    if watch is not None:
+        # Watching is started on the event loop once the model is loaded
+        loop = IOLoop.current()
+        loader.add_done_callback(
+            lambda model_container: loop.add_callback(
+                ModelWatcher(model_container, interval=watch).start
+            )
+        )
+    loader.start()
+    ui_view = UIView(loader, tile_cache=tile_cache)
     return ui_view.view
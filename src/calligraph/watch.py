@@ -0,0 +1,72 @@
+import datetime
+import logging
+
+import panel as pn
+from tornado.ioloop import IOLoop
+
+from calligraph.core import ModelContainer
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ModelWatcher:
+    """
+    Polls the model file of a `ModelContainer` and, when it has been
+    overwritten, reloads the variables whose content changed.
+
+    A change is only read once the size and modification time of the file have
+    stayed the same for one polling interval, so that a file that is still
+    being written is not read. The file is read and checksummed off the event
+    loop; the changes are then applied on it, so that sessions never see a
+    partly reloaded model. Sessions refresh their panes when they notice that
+    `model_container.revision` has changed.
+
+    Args:
+        model_container (ModelContainer)
+        interval (float): Polling interval in seconds.
+
+    """
+
+    def __init__(self, model_container: ModelContainer, interval: float = 2.0):
+        self.model_container = model_container
+        self.interval = interval
+        self._seen = None
+        self._reading = False
+
+    def start(self) -> None:
+        if not self.model_container.tracking_changes:
+            self.model_container.track_changes()
+        pn.state.schedule_task(
+            f"calligraph.watch:{self.model_container.path}",
+            self.poll,
+            period=datetime.timedelta(seconds=self.interval),
+        )
+
+    async def poll(self) -> None:
+        identity = self.model_container.file_identity()
+        previous, self._seen = self._seen, identity
+        if (
+            self._reading
+            or identity == self.model_container.loaded_file_identity
+            or identity != previous
+        ):
+            return
+        self._reading = True
+        try:
+            changes = await IOLoop.current().run_in_executor(
+                None, self.model_container.read_changes
+            )
+        except Exception as e:
+            # E.g. the file is being written again; retried at the next poll
+            LOGGER.warning(f"Reading {self.model_container.path} failed: {e}")
+            return
+        finally:
+            self._reading = False
+        changed = self.model_container.apply_changes(changes)
+        if changes["full"]:
+            LOGGER.info(f"Reloaded {self.model_container.path}")
+        else:
+            LOGGER.info(
+                f"Reloaded {len(changed)} changed variables from "
+                f"{self.model_container.path}: {', '.join(changed)}"
+            )